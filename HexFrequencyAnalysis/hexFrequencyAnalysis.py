@@ -2,18 +2,14 @@ import os
 import sys
 from pprint import pprint
 
-import matplotlib.pyplot as plt
-
 _path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(_path_parent)
 
-import matplotlib
 import argparse
 
 from Utility import sharedUtils
 
 config_path = os.path.join(_path_parent, 'config.ini')
-sharedUtils.set_matplotlib_backend(matplotlib, config_path)
 file_end = sharedUtils.get_single_value_from_config(config_path, 'FREQUENCYANALYSIS', 'file_end')
 
 parser = argparse.ArgumentParser('Frequency analysis')
@@ -29,6 +25,12 @@ parser.add_argument('--top_labels_size', help='Top labels text size', type=int,
 
 args = parser.parse_args()
 
+# Import matplotlib once the arguments are valid, it is slow to import
+import matplotlib
+
+sharedUtils.set_matplotlib_backend(matplotlib, config_path)
+import matplotlib.pyplot as plt
+
 with open(args.file) as f:
     hex_stream = f.read()
     len_f = len(hex_stream)
@@ -8,12 +8,6 @@ sys.path.append(_path_parent)
 import argparse
 import sqlite3
 from datetime import datetime
-from tqdm import tqdm
-import requests
-
-from influxdb_client import InfluxDBClient, Point, WriteOptions
-from influxdb_client.client.write_api import SYNCHRONOUS
-import utils
 import threading
 import queue
 
@@ -57,6 +51,14 @@ parser.add_argument('--cache_size',
                     type=int, default=3000)
 args = parser.parse_args()
 
+# Import the InfluxDB client and the IP utils once the arguments are valid, they are slow to import
+from tqdm import tqdm
+import requests
+
+from influxdb_client import InfluxDBClient, Point, WriteOptions
+from influxdb_client.client.write_api import SYNCHRONOUS
+import utils
+
 url, bucket, p_measurement, n_measurement = sharedUtils.get_config_influxdb_from_file(config_path)
 url = args.url if args.url else url
 
@@ -146,7 +148,7 @@ def worker_power(jobs):
                          desc=f'{dataset["label"]} power data [{chunk_number}/{total_chunks}]'):
             point = Point(p_measurement).tag('label', dataset['label'])
             for i, column in enumerate(dataset['p_columns']):
-                if i != dataset['p_ts_index']:
+                if i != dataset['p_ts_index'] and column[1] not in sharedUtils.INT_TIMESTAMPS_COLUMN_NAMES:
                     point = point.field(column[1], data[i])
             point = point.time(datetime.fromisoformat(data[dataset['p_ts_index']]))
             cache.append(point)
@@ -168,7 +170,7 @@ def worker_network(jobs):
             point = Point(n_measurement).tag('label', dataset['label'])
             for i, column in enumerate(dataset['n_columns']):
                 if i not in [dataset['n_ts_index'],
-                             dataset['n_hostname_index']]:
+                             dataset['n_hostname_index']] and column[1] not in sharedUtils.INT_TIMESTAMPS_COLUMN_NAMES:
                     point = point.field(column[1], data[i])
             point = point.time(datetime.fromisoformat(data[dataset['n_ts_index']]))
             dst_ip = data[dataset['n_dst_index']]
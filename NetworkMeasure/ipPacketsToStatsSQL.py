@@ -1,13 +1,8 @@
-from scapy.layers.dns import DNS, DNSRR
-import scapy.all as scapy
-from tqdm import tqdm
-import utils
+import pcapFast
 import os
 import sys
 import argparse
 import sqlite3
-import re
-from datetime import datetime, timezone
 
 # Ensure project root (parent of this folder) is on sys.path before local imports
 _path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,13 +11,13 @@ if _path_parent not in sys.path:
 
 # Local imports (now resolvable)
 try:
-    from Utility import sharedUtils  # type: ignore
+    from Utility import parquetStore, sharedUtils, sqlWriter  # type: ignore
 except ModuleNotFoundError:
     # Fallback: attempt to add one more parent (in case of different invocation path)
     _alt_parent = os.path.dirname(_path_parent)
     if _alt_parent not in sys.path:
         sys.path.append(_alt_parent)
-    from Utility import sharedUtils  # type: ignore
+    from Utility import parquetStore, sharedUtils, sqlWriter  # type: ignore
 
 
 # Parse config file
@@ -30,106 +25,219 @@ config_path = os.path.join(_path_parent, 'config.ini')
 file_end = sharedUtils.get_file_end_from_config(config_path)
 _, table_name, _ = sharedUtils.get_chart_config_from_file(
     config_path, 'NETWORK')
-
-# Parse command line arguments
-parser = argparse.ArgumentParser(
-    description='Convert pcap file to SQL stats, it considers only IP packets. ARP and some other packets are ignored.')
-sharedUtils.parser_add_db_args(parser, table_name)
-parser.add_argument('--pcap', help='pcap file', required=True)
-print_args = parser.add_mutually_exclusive_group()
-print_args.add_argument(
-    '--n_packets', help='number of packets to process, used for the progress bar', type=int)
-print_args.add_argument(
-    '-v', '--verbose', action='store_true', help='verbose output')
-args = parser.parse_args()
-
-# Connect to the database
-db_name = args.db if sharedUtils.check_file_end(
-    args.db, file_end) else args.db + file_end
-conn = sqlite3.connect(db_name)
-c = conn.cursor()
-
-# Reset the database if requested
-if args.db_reset:
-    c.execute('DROP TABLE IF EXISTS ' + table_name)
-    conn.commit()
-
-# Create the table if it doesn't exist
-try:
-    c.execute(
-        'CREATE TABLE ' + table_name + ' (No INT PRIMARY KEY, timestamp TIMESTAMP, src TEXT, sport INT, dst TEXT, dport INT, transport TEXT, length INT, flags TEXT, hostname TEXT)')
-except sqlite3.OperationalError:
-    pass
-
-# Open the pcap file
-pcap = scapy.PcapReader(args.pcap)
-
-# Print the headers if verbose
-VERBOSE_HEADERS = '[No] [Timestamp] Src[SrcPort] -> Dst[DstPort] [Protocol] [Length] [Flags]'
-if args.verbose:
-    print(VERBOSE_HEADERS)
-
-# Choose the type of iterator
-iterator = enumerate(pcap, 1)
-if not args.verbose:
-    iterator = tqdm(iterator, total=args.n_packets,
-                    unit='packets', desc='Processing packets')
-
-# Process the packets
-skipped = 0
-dns_hostnames = {}
-for i, pkt in iterator:
-    ip_type = utils.get_ip_layer(pkt)
-    if ip_type:
-        if pkt.haslayer(DNS):
-            dns = pkt[DNS]
-            if getattr(dns, 'ancount', 0) > 0 and dns.an is not None:
-                rr = dns.an
-                processed = 0
-                while isinstance(rr, DNSRR) and processed < dns.ancount:
-                    try:
-                        rdata = rr.rdata.decode(
-                            'utf-8') if isinstance(rr.rdata, bytes) else rr.rdata
-                        if isinstance(rdata, str) and re.match(r'^\d{1,3}(?:\.\d{1,3}){3}$', str(rdata)):
-                            rrname = rr.rrname.decode(
-                                'utf-8') if isinstance(rr.rrname, bytes) else str(rr.rrname)
-                            if rrname.endswith('.'):
-                                rrname = rrname[:-1]
-                            # store first seen hostname for an IP if not already mapped
-                            dns_hostnames.setdefault(rdata, rrname)
-                    except Exception:
-                        pass  # Ignore malformed RR
-                    processed += 1
-                    rr = rr.payload
-
-        ip = pkt[ip_type]
-        transport = ip.payload
-        protocol, sport, dport = utils.get_protocol_and_ports(transport)
-        ts = datetime.fromtimestamp(
-            float(pkt.time), tz=timezone.utc).isoformat()
-
-        src = ip.src
-        dst = ip.dst
-        length = len(pkt)
-        flags = str(transport.flags) if protocol == 'TCP' else None
-
+rollup_tables = {freq: sharedUtils.get_rollup_table_name(table_name, freq) for freq in sharedUtils.ROLLUP_FREQS}
+
+
+if __name__ == '__main__':
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description='Convert pcap file to SQL stats, it considers only IP packets. ARP and some other packets are ignored.')
+    sharedUtils.parser_add_db_args(parser, table_name)
+    parser.add_argument('--pcap', help='pcap or pcapng file, also gzip or xz compressed (.gz, .xz). With --follow it '
+                                       'can be a glob pattern of rotating pcap files', required=True)
+    parser.add_argument('--engine', choices=['scapy', 'fast'], default='scapy',
+                        help='Packet parser. "fast" decodes Ethernet/IP/TCP/UDP/DNS headers directly from the pcap '
+                             'records and uses scapy only for what it does not understand. Default: scapy')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes parsing the pcap in parallel, each one parses byte ranges of '
+                             'the file. Default: 1')
+    sharedUtils.parser_add_int_timestamps_args(parser)
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the checkpoint saved in the DB by a previous run on the same pcap, e.g. '
+                             'after a crash or to add the packets appended to the pcap since then')
+    parquet_args = parser.add_argument_group('columnar output')
+    parquet_args.add_argument('--parquet', action='store_true',
+                              help='Write the packets also to a Parquet dataset next to the DB, the charts read it '
+                                   'instead of the table when it can answer the query and has all the rows of the '
+                                   'table. Every run adds one file that is visible once the run ends. Needs pyarrow')
+    parquet_args.add_argument('--row_group_size', type=int, default=100000,
+                              help='Packets in every row group of the Parquet files. Default: 100000')
+    follow_args = parser.add_argument_group('follow mode')
+    follow_args.add_argument('--follow', action='store_true',
+                             help='Keep reading the pcap while it is written, e.g. by tcpdump, until Ctrl+C')
+    follow_args.add_argument('--poll_interval', type=float, default=0.5,
+                             help='Seconds to wait for new packets before reading the pcap again. Default: 0.5')
+    follow_args.add_argument('--max_latency', type=float, default=1.0,
+                             help='Max seconds a packet waits in the buffer before being written. Default: 1')
+    follow_args.add_argument('--idle_timeout', type=float,
+                             help='Stop following after this many seconds without new packets')
+    sharedUtils.parser_add_sql_write_args(parser)
+    print_args = parser.add_mutually_exclusive_group()
+    print_args.add_argument(
+        '--n_packets', type=int,
+        help='number of packets to process, used for the progress bar. Default: progress of the bytes read of the file')
+    print_args.add_argument(
+        '-v', '--verbose', action='store_true', help='verbose output')
+    args = parser.parse_args()
+    if args.resume and args.db_reset:
+        parser.error('--resume cannot be used with --db_reset')
+    if args.follow and args.workers > 1:
+        parser.error('--follow cannot be used with --workers')
+    if args.parquet and not parquetStore.is_available():
+        parser.error('--parquet needs pyarrow, install it with: pip install pyarrow')
+
+    # Import the packet parsers and tqdm once the arguments are valid, scapy is slow to import
+    import pcapIngest
+    from tqdm import tqdm
+
+    # Connect to the database
+    db_name = args.db if sharedUtils.check_file_end(
+        args.db, file_end) else args.db + file_end
+    conn = sqlite3.connect(db_name)
+    sqlWriter.set_bulk_pragmas(conn, args.journal_mode, args.synchronous)
+    c = conn.cursor()
+
+    # Reset the database if requested
+    if args.db_reset:
+        c.execute('DROP TABLE IF EXISTS ' + table_name)
+        conn.commit()
+        pcapIngest.drop_checkpoint_tables(conn)
+        pcapIngest.drop_rollup_tables(conn, rollup_tables)
+        parquetStore.drop_dataset(db_name, table_name, conn)
+
+    # Create the table if it doesn't exist
+    int_timestamps_columns = ', ' + sharedUtils.INT_TIMESTAMPS_COLUMNS if args.int_timestamps else ''
+    try:
         c.execute(
-            'INSERT INTO pcap_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-            (i, ts, src, sport, dst, dport, protocol, length, flags,
-             dns_hostnames.get(dst)))
-
-        if args.verbose:
-            print(
-                f'[#{i}] [{ts}] {src}[{sport}] -> {dst}[{dport}] {protocol} {length} {flags}')
-    else:
-        skipped += 1
-
-# Commit the changes and close the connection
-conn.commit()
-conn.close()
-
-if args.verbose:
-    print(VERBOSE_HEADERS)
-
-print(f'Skipped {skipped} no IP packets')
-print(f'Saved packets to {db_name}')
+            'CREATE TABLE ' + table_name + ' (No INT PRIMARY KEY, timestamp TIMESTAMP, src TEXT, sport INT, dst TEXT, dport INT, transport TEXT, length INT, flags TEXT, hostname TEXT' + int_timestamps_columns + ')')
+        if args.int_timestamps:
+            sharedUtils.create_int_timestamps_indexes(conn, table_name)
+    except sqlite3.OperationalError:
+        if args.int_timestamps and not sharedUtils.has_int_timestamps(db_name, table_name, conn):
+            print(f'Adding the integer timestamps to the existing rows of {table_name}')
+            sharedUtils.add_int_timestamps(conn, table_name)
+    int_timestamps = sharedUtils.has_int_timestamps(db_name, table_name, conn)
+    pcapIngest.create_checkpoint_tables(conn)
+    pcapIngest.create_rollup_tables(conn, rollup_tables, table_name)
+
+    # Load the checkpoint to resume from
+    last_pcap = None if args.follow else args.pcap
+    start_offset = None
+    last_no = 0
+    dns_hostnames = {}
+    if args.resume:
+        if args.follow:
+            checkpoint = pcapIngest.load_follow_checkpoint(conn, args.pcap)
+        else:
+            checkpoint = pcapIngest.load_checkpoint(conn, args.pcap)
+            checkpoint = (args.pcap,) + checkpoint if checkpoint else None
+        if checkpoint is None:
+            conn.close()
+            sys.exit(f'No checkpoint for {args.pcap} in {db_name}')
+        last_pcap, last_no, start_offset, dns_hostnames = checkpoint
+        print(f'Resuming {last_pcap} after packet #{last_no} (offset {start_offset}) with {len(dns_hostnames)} known '
+              f'hostnames')
+    last_offset = start_offset
+
+    # Print the headers if verbose
+    VERBOSE_HEADERS = '[No] [Timestamp] Src[SrcPort] -> Dst[DstPort] [Protocol] [Length] [Flags]'
+    if args.verbose:
+        print(VERBOSE_HEADERS)
+
+    # Show the progress of the bytes read of the file, compressed files are read as a stream so there is no need to
+    # decompress or count the packets before
+    def byte_progress(packets, total, update_every=1000):
+        with tqdm(total=total, initial=packets.position(), unit='B', unit_scale=True, unit_divisor=1024,
+                  desc='Processing packets') as bar:
+            for n, packet in enumerate(packets, 1):
+                yield packet
+                if n % update_every == 0:
+                    bar.update(packets.position() - bar.n)
+            bar.update(total - bar.n)
+
+    # Choose the type of iterator
+    n_packets = args.n_packets
+    follower = None
+    if args.follow:
+        follower = pcapIngest.PcapFollower(args.pcap, args.engine, last_pcap, start_offset, last_no + 1,
+                                           args.poll_interval, args.idle_timeout)
+        iterator = follower
+        print(f'Following {args.pcap}, press Ctrl+C to stop')
+    elif args.workers > 1:
+        try:
+            shards, n_packets = pcapIngest.index_shards(args.pcap, args.workers * 4, start_offset, last_no + 1)
+            iterator = pcapIngest.sharded_packets(args.pcap, args.engine, shards, args.workers)
+        except pcapFast.PcapFormatError as e:
+            print(f'{e}, --workers needs a pcap file, processing it in one process')
+            args.workers = 1
+    if not args.follow and args.workers <= 1:
+        iterator = pcapIngest.get_packets(args.pcap, args.engine, start_offset, last_no + 1)
+    if not args.verbose and not args.follow:
+        if n_packets or args.workers > 1:
+            iterator = tqdm(iterator, total=n_packets,
+                            unit='packets', desc='Processing packets')
+        else:
+            iterator = byte_progress(iterator, os.path.getsize(args.pcap))
+
+    # Save the rollups and the checkpoint in the same transaction of every batch of rows
+    new_hostnames = []
+    rollups = pcapIngest.RollupAccumulator(rollup_tables)
+
+    def save_checkpoint(_conn):
+        rollups.write(_conn)
+        if last_pcap is not None:
+            pcapIngest.save_checkpoint(_conn, last_pcap, last_no, last_offset, new_hostnames)
+        new_hostnames.clear()
+
+    # Process the packets
+    skipped = 0
+    sql_values = ', '.join('?' * (12 if int_timestamps else 10))
+    writer = sqlWriter.BufferedWriter(conn, f'INSERT INTO {table_name} VALUES ({sql_values})', args.batch_size,
+                                      on_flush=save_checkpoint, max_delay=args.max_latency if args.follow else None)
+    parquet_writer = None
+    if args.parquet:
+        parquet_writer = parquetStore.ParquetRowWriter(parquetStore.get_dataset_path(db_name, table_name),
+                                                       f'part-{last_no + 1:012d}', parquetStore.get_pcap_stats_schema(),
+                                                       args.row_group_size)
+    try:
+        for packet in iterator:
+            # No new packets in follow mode, write what is buffered
+            if packet is None:
+                if writer.rows:
+                    writer.flush()
+                continue
+
+            i, ts, length, info, offset = packet
+            last_no, last_offset = i, offset
+            if follower:
+                last_pcap = follower.current_path
+            if info:
+                src, sport, dst, dport, protocol, flags, dns_answers = info
+                for ip, hostname in dns_answers:
+                    # store first seen hostname for an IP if not already mapped
+                    if ip not in dns_hostnames:
+                        dns_hostnames[ip] = hostname
+                        new_hostnames.append((ip, hostname, ts))
+
+                rollups.add(ts, protocol, dst, length)
+                row = (i, ts, src, sport, dst, dport, protocol, length, flags, dns_hostnames.get(dst))
+                writer.add(row + sharedUtils.get_int_timestamps(ts) if int_timestamps else row)
+                if parquet_writer:
+                    parquet_writer.add(row)
+
+                if args.verbose:
+                    print(
+                        f'[#{i}] [{ts}] {src}[{sport}] -> {dst}[{dport}] {protocol} {length} {flags}')
+            else:
+                skipped += 1
+    except KeyboardInterrupt:
+        print('Stopped, writing the buffered packets')
+
+    # Write the remaining rows and close the connection, the rows of the Parquet file are added to the coverage once
+    # it is visible
+    writer.close()
+    if parquet_writer:
+        parquet_writer.close()
+        parquetStore.add_dataset_rows(conn, table_name, parquet_writer.written)
+        print(f'Saved {parquet_writer.written} packets to {parquet_writer.path}')
+        if not parquetStore.is_dataset_complete(conn, table_name):
+            print(f'The Parquet dataset does not have all the rows of {table_name}, e.g. after a crash or an ingest '
+                  f'without --parquet, the charts read the table')
+    conn.close()
+
+    if args.verbose:
+        print(VERBOSE_HEADERS)
+
+    print(f'Skipped {skipped} no IP packets')
+    print(f'Saved {writer.written} packets to {db_name} in {writer.elapsed():.2f} seconds '
+          f'({writer.rows_per_second():.0f} rows/s)')
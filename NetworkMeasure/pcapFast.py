@@ -0,0 +1,401 @@
+import gzip
+import lzma
+import os
+import socket
+import struct
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+# Link types decoded without scapy, see https://www.tcpdump.org/linktypes.html
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+SUPPORTED_LINKTYPES = {LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL, LINKTYPE_IPV4, LINKTYPE_IPV6}
+
+# Returned by decode_packet when the packet has to be dissected by scapy to get the same values
+FALLBACK = object()
+
+PCAP_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+PCAPNG_BLOCK_HEADER_LEN = 8
+
+# Compressed captures are decoded as a stream, magic number -> opener of the file object
+_COMPRESSION_MAGICS = {
+    b'\x1f\x8b': lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'),
+    b'\xfd7zXZ\x00': lambda raw: lzma.LZMAFile(raw),
+}
+
+# magic number -> (byte order, nanosecond resolution)
+_PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', False),
+    b'\xa1\xb2\xc3\xd4': ('>', False),
+    b'\x4d\x3c\xb2\xa1': ('<', True),
+    b'\xa1\xb2\x3c\x4d': ('>', True),
+}
+
+_ETH_TYPE_IPV4 = 0x0800
+_ETH_TYPE_IPV6 = 0x86dd
+_ETH_TYPES_VLAN = {0x8100, 0x88a8}
+
+_PROTO_ICMP = 1
+_PROTO_TCP = 6
+_PROTO_UDP = 17
+_DNS_PORT = 53
+_DNS_TYPE_A = 1
+_DNS_TYPE_AAAA = 28
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_u16 = struct.Struct('!H')
+_dns_header = struct.Struct('!6H')
+_dns_rr = struct.Struct('!HHIH')
+
+
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_PCAPNG_IDB = 1
+_PCAPNG_EPB = 6
+_PCAPNG_OPT_TSRESOL = 9
+_PCAPNG_OPT_TSOFFSET = 14
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+# Open a capture file, gzip and xz files are decompressed while they are read.
+# Return the file object to read and the file on disk, they are the same object if it is not compressed
+def open_capture(path):
+    raw = open(path, 'rb')
+    magic = raw.read(6)
+    raw.seek(0)
+    for prefix, opener in _COMPRESSION_MAGICS.items():
+        if magic.startswith(prefix):
+            return opener(raw), raw
+    return raw, raw
+
+
+# Base of the readers of the records of a capture file, the offsets are in the decompressed stream
+class CaptureReader(ABC):
+    def __init__(self, path, f=None, raw=None):
+        self.path = path
+        self.f, self.raw = (f, raw) if f is not None else open_capture(path)
+        self.linktype = None
+        self.offset = 0
+
+    # Check if the file is compressed, the offsets of a compressed file cannot be reached without reading it
+    def is_compressed(self):
+        return self.f is not self.raw
+
+    # Get the bytes read of the file on disk
+    def position(self):
+        return self.raw.tell()
+
+    def seek(self, offset):
+        self.f.seek(offset)
+        self.offset = offset
+
+    def __iter__(self):
+        return self.records()
+
+    @abstractmethod
+    def records(self, end=None):
+        pass
+
+    def close(self):
+        self.f.close()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Read the pcap records without dissecting them, every record is (offset, seconds, microseconds, data)
+class PcapRawReader(CaptureReader):
+    def __init__(self, path, f=None, raw=None):
+        super().__init__(path, f, raw)
+        header = self.f.read(PCAP_HEADER_LEN)
+        if len(header) < PCAP_HEADER_LEN or header[:4] not in _PCAP_MAGICS:
+            self.close()
+            raise PcapFormatError(f'{path} is not a pcap file')
+        endian, self.nano = _PCAP_MAGICS[header[:4]]
+        self._record_header = struct.Struct(endian + 'IIII')
+        self.snaplen, self.linktype = struct.unpack(endian + 'II', header[16:24])
+        self.offset = PCAP_HEADER_LEN
+
+    # Read the records until the end of the file or until the offset end
+    def records(self, end=None):
+        read = self.f.read
+        unpack = self._record_header.unpack
+        nano = self.nano
+        while end is None or self.offset < end:
+            header = read(PCAP_RECORD_HEADER_LEN)
+            if len(header) < PCAP_RECORD_HEADER_LEN:
+                return
+            sec, frac, caplen, _ = unpack(header)
+            data = read(caplen)
+            if len(data) < caplen:
+                return
+            offset = self.offset
+            self.offset += PCAP_RECORD_HEADER_LEN + caplen
+            yield offset, sec, (frac + 500) // 1000 if nano else frac, data
+
+    # Read only the record headers, yield (offset, caplen) of every complete record
+    def headers(self):
+        size = os.fstat(self.f.fileno()).st_size
+        unpack = self._record_header.unpack
+        while self.offset + PCAP_RECORD_HEADER_LEN <= size:
+            _, _, caplen, _ = unpack(self.f.read(PCAP_RECORD_HEADER_LEN))
+            end = self.offset + PCAP_RECORD_HEADER_LEN + caplen
+            if end > size:
+                return
+            yield self.offset, caplen
+            self.seek(end)
+
+
+# Read the Enhanced Packet Blocks of a pcapng file without dissecting them, every record is
+# (offset, seconds, microseconds, data) and linktype is the one of the interface of the last record
+class PcapngRawReader(CaptureReader):
+    def __init__(self, path, f=None, raw=None):
+        super().__init__(path, f, raw)
+        self._endian = '<'
+        self._interfaces = []
+        block = self.read_block()
+        if block is None or block[0] != _PCAPNG_SHB:
+            self.close()
+            raise PcapFormatError(f'{path} is not a pcapng file')
+        self.read_section_header(block[1])
+        self.offset = self.f.tell()
+        # Read the blocks before the first packet to know the link type
+        for offset, _, _, _ in self.records():
+            self.seek(offset)
+            break
+        if self.linktype is None and self._interfaces:
+            self.linktype = self._interfaces[0][0]
+
+    # Read a block, return (type, body) or None if it is not complete
+    def read_block(self):
+        header = self.f.read(PCAPNG_BLOCK_HEADER_LEN)
+        if len(header) < PCAPNG_BLOCK_HEADER_LEN:
+            return None
+        block_type = struct.unpack(self._endian + 'I', header[:4])[0]
+        body = b''
+        if block_type == _PCAPNG_SHB:
+            # The byte order of a new section is known only from its header
+            body = self.f.read(4)
+            if len(body) < 4:
+                return None
+            self._endian = '<' if struct.unpack('<I', body)[0] == _PCAPNG_BYTE_ORDER_MAGIC else '>'
+        length = struct.unpack(self._endian + 'I', header[4:])[0]
+        if length < PCAPNG_BLOCK_HEADER_LEN + 4 or length % 4:
+            raise PcapFormatError(f'{self.path} has a pcapng block of bad length {length}')
+        body += self.f.read(length - PCAPNG_BLOCK_HEADER_LEN - len(body))
+        if len(body) < length - PCAPNG_BLOCK_HEADER_LEN:
+            return None
+        return block_type, body
+
+    def read_section_header(self, body):
+        if struct.unpack(self._endian + 'I', body[:4])[0] != _PCAPNG_BYTE_ORDER_MAGIC:
+            raise PcapFormatError(f'{self.path} has a bad pcapng section header')
+        self._interfaces = []
+
+    # Add an interface as (link type, units per second, offset seconds)
+    def read_interface(self, body):
+        linktype = struct.unpack_from(self._endian + 'H', body, 0)[0]
+        units, ts_offset = 10 ** 6, 0
+        offset = 8
+        while offset + 4 <= len(body) - 4:
+            code, length = struct.unpack_from(self._endian + 'HH', body, offset)
+            if code == 0:
+                break
+            value = body[offset + 4:offset + 4 + length]
+            if code == _PCAPNG_OPT_TSRESOL and length == 1:
+                units = 2 ** (value[0] & 0x7f) if value[0] & 0x80 else 10 ** value[0]
+            elif code == _PCAPNG_OPT_TSOFFSET and length == 8:
+                ts_offset = struct.unpack(self._endian + 'q', value)[0]
+            offset += 4 + (length + 3) // 4 * 4
+        self._interfaces.append((linktype, units, ts_offset))
+
+    # Read the records until the end of the file or until the offset end
+    def records(self, end=None):
+        epb_header = struct.Struct(self._endian + 'IIIII')
+        while end is None or self.offset < end:
+            block = self.read_block()
+            if block is None:
+                return
+            block_type, body = block
+            offset = self.offset
+            self.offset += PCAPNG_BLOCK_HEADER_LEN + len(body)
+            if block_type == _PCAPNG_SHB:
+                self.read_section_header(body)
+                epb_header = struct.Struct(self._endian + 'IIIII')
+            elif block_type == _PCAPNG_IDB:
+                self.read_interface(body)
+            elif block_type == _PCAPNG_EPB:
+                interface, ts_high, ts_low, caplen, _ = epb_header.unpack_from(body, 0)
+                if interface >= len(self._interfaces):
+                    raise PcapFormatError(f'{self.path} has a packet of the unknown interface {interface}')
+                self.linktype, units, ts_offset = self._interfaces[interface]
+                sec, frac = divmod((ts_high << 32) | ts_low, units)
+                yield (offset, sec + ts_offset, (frac * 10 ** 6 + units // 2) // units,
+                       body[epb_header.size:epb_header.size + caplen])
+
+
+# Open a pcap or pcapng file, also gzip or xz compressed, raise PcapFormatError if it is none of them
+def open_reader(path):
+    f, raw = open_capture(path)
+    try:
+        magic = f.read(4)
+        f.seek(0)
+    except (OSError, EOFError, lzma.LZMAError) as e:
+        f.close()
+        raw.close()
+        raise PcapFormatError(f'{path} cannot be decompressed: {e}')
+    if struct.unpack('<I', magic.ljust(4, b'\0'))[0] == _PCAPNG_SHB:
+        return PcapngRawReader(path, f, raw)
+    return PcapRawReader(path, f, raw)
+
+
+# Get the ISO timestamp of a record, same value of datetime.fromtimestamp(pkt.time, tz=timezone.utc).isoformat()
+def get_iso_timestamp(sec, usec):
+    return (_EPOCH + timedelta(seconds=sec, microseconds=usec)).isoformat()
+
+
+# Get the IP version and the offset of the IP header in the frame, (None, None) if it is not an IP packet
+def get_ip_offset(linktype, data):
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None, None
+        eth_type = _u16.unpack_from(data, 12)[0]
+        offset = 14
+        while eth_type in _ETH_TYPES_VLAN and len(data) >= offset + 4:
+            eth_type = _u16.unpack_from(data, offset + 2)[0]
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None, None
+        eth_type = _u16.unpack_from(data, 14)[0]
+        offset = 16
+    elif linktype == LINKTYPE_IPV4:
+        return 4, 0
+    elif linktype == LINKTYPE_IPV6:
+        return 6, 0
+    else:
+        if not data:
+            return None, None
+        version = data[0] >> 4
+        return (version, 0) if version in (4, 6) else (None, None)
+
+    if eth_type == _ETH_TYPE_IPV4:
+        return 4, offset
+    if eth_type == _ETH_TYPE_IPV6:
+        return 6, offset
+    return None, None
+
+
+# Read a possibly compressed DNS name, return the name and the offset after it
+def read_dns_name(msg, offset):
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = msg[offset]
+        if length & 0xc0 == 0xc0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3f) << 8) | msg[offset + 1]
+            jumps += 1
+            if jumps > 32:
+                raise PcapFormatError('DNS name compression loop')
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(msg[offset:offset + length])
+        offset += length
+    return b'.'.join(labels).decode('utf-8'), end if end is not None else offset
+
+
+# Get the (ip, hostname) pairs of the A and AAAA records in the answers of a DNS message
+def get_dns_answers(msg):
+    answers = []
+    try:
+        _, _, qdcount, ancount, _, _ = _dns_header.unpack_from(msg, 0)
+        offset = _dns_header.size
+        for _ in range(qdcount):
+            _, offset = read_dns_name(msg, offset)
+            offset += 4
+        for _ in range(ancount):
+            rrname, offset = read_dns_name(msg, offset)
+            rr_type, _, _, rdlength = _dns_rr.unpack_from(msg, offset)
+            offset += _dns_rr.size
+            if offset + rdlength <= len(msg):
+                if rr_type == _DNS_TYPE_A and rdlength == 4:
+                    answers.append((socket.inet_ntoa(msg[offset:offset + 4]), rrname))
+                elif rr_type == _DNS_TYPE_AAAA and rdlength == 16:
+                    answers.append((socket.inet_ntop(socket.AF_INET6, msg[offset:offset + 16]), rrname))
+            offset += rdlength
+    except (IndexError, struct.error, UnicodeDecodeError, PcapFormatError):
+        pass  # Ignore malformed or truncated DNS messages, keep the answers read so far
+    return answers
+
+
+# Get the TCP flags as scapy prints them, e.g. "SA" or "PA"
+def get_tcp_flags(flags):
+    return ''.join(letter for bit, letter in enumerate('FSRPAUECN') if flags & (1 << bit))
+
+
+# Decode a frame, return None if it is not an IP packet, FALLBACK if scapy is needed, otherwise
+# (src, sport, dst, dport, transport, flags, dns_answers)
+def decode_packet(linktype, data):
+    version, offset = get_ip_offset(linktype, data)
+    if version is None:
+        return None
+
+    if version == 4:
+        if len(data) < offset + 20:
+            return FALLBACK
+        ihl = (data[offset] & 0x0f) * 4
+        frag = _u16.unpack_from(data, offset + 6)[0] & 0x1fff
+        proto = data[offset + 9]
+        src = socket.inet_ntoa(data[offset + 12:offset + 16])
+        dst = socket.inet_ntoa(data[offset + 16:offset + 20])
+        if frag or ihl < 20:
+            return FALLBACK
+        offset += ihl
+    elif version == 6:
+        if len(data) < offset + 40:
+            return FALLBACK
+        proto = data[offset + 6]
+        src = socket.inet_ntop(socket.AF_INET6, data[offset + 8:offset + 24])
+        dst = socket.inet_ntop(socket.AF_INET6, data[offset + 24:offset + 40])
+        offset += 40
+    else:
+        return FALLBACK
+
+    if proto == _PROTO_TCP:
+        if len(data) < offset + 20:
+            return FALLBACK
+        sport, dport = struct.unpack_from('!HH', data, offset)
+        flags = get_tcp_flags(_u16.unpack_from(data, offset + 12)[0] & 0x01ff)
+        answers = []
+        if sport == _DNS_PORT or dport == _DNS_PORT:
+            payload = data[offset + (data[offset + 12] >> 4) * 4:]
+            answers = get_dns_answers(payload[2:])
+        return src, sport, dst, dport, 'TCP', flags, answers
+    if proto == _PROTO_UDP:
+        if len(data) < offset + 8:
+            return FALLBACK
+        sport, dport = struct.unpack_from('!HH', data, offset)
+        answers = []
+        if sport == _DNS_PORT or dport == _DNS_PORT:
+            answers = get_dns_answers(data[offset + 8:])
+        return src, sport, dst, dport, 'UDP', None, answers
+    if proto == _PROTO_ICMP and version == 4:
+        return src, None, dst, None, 'ICMP', None, []
+    return FALLBACK
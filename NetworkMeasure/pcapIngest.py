@@ -0,0 +1,368 @@
+import collections
+import glob
+import hashlib
+import ipaddress
+import itertools
+import multiprocessing
+import os
+import time
+from datetime import datetime, timezone
+
+import scapy.all as scapy
+
+import pcapFast
+import utils
+from Utility import sharedUtils
+
+CHECKPOINT_TABLE = 'ingest_checkpoint'
+DNS_TABLE = 'dns_hostnames'
+# Bytes at the start of a pcap file hashed in its checkpoint, to tell it from another file later written at its path
+HEADER_HASH_SIZE = 4096
+
+
+# Get the packet info of a raw record, scapy is used only for what pcapFast does not understand
+def get_record_info(linktype, data, fast=True):
+    info = pcapFast.decode_packet(linktype, data) if fast and linktype in pcapFast.SUPPORTED_LINKTYPES else \
+        pcapFast.FALLBACK
+    if info is pcapFast.FALLBACK:
+        info = utils.get_packet_info(utils.dissect_raw(linktype, data))
+    return info
+
+
+# The packets of a capture file and position() that returns the bytes read of the file on disk, to show the progress
+# of files that are compressed or whose packets have not been counted
+class CapturePackets:
+    def __init__(self, packets, position):
+        self.packets = packets
+        self.position = position
+
+    def __iter__(self):
+        return iter(self.packets)
+
+
+# Read the packets with scapy, yield (No, timestamp, length, packet info, offset of the next record)
+def scapy_packets(pcap_path, skip=0):
+    pcap = scapy.PcapReader(pcap_path)
+
+    def read_packets():
+        for n, pkt in enumerate(itertools.islice(pcap, skip, None), skip + 1):
+            ts = datetime.fromtimestamp(float(pkt.time), tz=timezone.utc).isoformat()
+            yield n, ts, len(pkt), utils.get_packet_info(pkt), pcap.f.tell()
+
+    return CapturePackets(read_packets(), pcap.f.tell)
+
+
+# Yield (No, timestamp, length, packet info, offset of the next record) of the records of an opened reader
+def read_raw_packets(reader, fast=True, first_no=1):
+    with reader:
+        for n, (_, sec, usec, data) in enumerate(reader, first_no):
+            yield (n, pcapFast.get_iso_timestamp(sec, usec), len(data), get_record_info(reader.linktype, data, fast),
+                   reader.offset)
+
+
+# Read the packets decoding the raw records of an opened reader from the offset start
+def raw_packets(reader, fast=True, start=None, first_no=1):
+    if fast and reader.linktype is not None and reader.linktype not in pcapFast.SUPPORTED_LINKTYPES:
+        print(f'Link type {reader.linktype} is not supported by the fast engine, using scapy to dissect the packets')
+    if start is not None:
+        reader.seek(start)
+    return CapturePackets(read_raw_packets(reader, fast, first_no), reader.position)
+
+
+# Choose the packets reader for the engine, resuming from the offset start if given. pcapng and compressed files are
+# always read by pcapFast, with the scapy engine it dissects every packet with scapy
+def get_packets(pcap_path, engine, start=None, first_no=1):
+    try:
+        reader = pcapFast.open_reader(pcap_path)
+    except pcapFast.PcapFormatError as e:
+        print(f'{e}, falling back to the scapy reader')
+        return scapy_packets(pcap_path, skip=first_no - 1)
+    if engine == 'scapy' and start is None and isinstance(reader, pcapFast.PcapRawReader) and \
+            not reader.is_compressed():
+        reader.close()
+        return scapy_packets(pcap_path, skip=first_no - 1)
+    return raw_packets(reader, engine == 'fast', start, first_no)
+
+
+# Split a pcap file in byte ranges of whole records, return the shards (start, end, first No) and the packets count
+def index_shards(pcap_path, n_shards, start=None, first_no=1):
+    with pcapFast.PcapRawReader(pcap_path) as reader:
+        if reader.is_compressed():
+            raise pcapFast.PcapFormatError(f'{pcap_path} is compressed')
+        if start is not None:
+            reader.seek(start)
+        shard_size = max(1, (os.path.getsize(pcap_path) - reader.offset) // max(1, n_shards))
+        shards = []
+        start = reader.offset
+        n = first_no
+        for offset, _ in reader.headers():
+            if offset - start >= shard_size:
+                shards.append((start, offset, first_no))
+                start = offset
+                first_no = n
+            n += 1
+        if n > first_no:
+            shards.append((start, reader.offset, first_no))
+
+    return shards, n - shards[0][2] if shards else 0
+
+
+# Parse one shard in a worker process, return the list of (No, timestamp, length, packet info, next offset)
+def parse_shard(job):
+    pcap_path, engine, start, end, first_no = job
+    packets = []
+    with pcapFast.PcapRawReader(pcap_path) as reader:
+        reader.seek(start)
+        for n, (_, sec, usec, data) in enumerate(reader.records(end), first_no):
+            packets.append((n, pcapFast.get_iso_timestamp(sec, usec), len(data),
+                            get_record_info(reader.linktype, data, engine == 'fast'), reader.offset))
+
+    return packets
+
+
+# Parse the shards in a pool of processes, yield the packets in the same order of a sequential read. Only one shard
+# per worker is parsed ahead of the one being yielded, so the memory does not grow up to the whole capture when the
+# packets are consumed slower than they are parsed
+def sharded_packets(pcap_path, engine, shards, workers):
+    jobs = iter([(pcap_path, engine, start, end, first_no) for start, end, first_no in shards])
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque(pool.apply_async(parse_shard, (job,)) for job in itertools.islice(jobs, workers))
+        while pending:
+            packets = pending.popleft().get()
+            for job in itertools.islice(jobs, 1):
+                pending.append(pool.apply_async(parse_shard, (job,)))
+            yield from packets
+
+
+# Get the files matching a path or a glob pattern, oldest written first as a rotating capture writes them
+def get_follow_files(pattern):
+    return sorted(glob.glob(pattern), key=lambda path: (os.path.getmtime(path), path))
+
+
+# Follow a growing pcap, or a rotating set of pcap files matching a glob pattern, while they are written.
+# It yields the packets as (No, timestamp, length, packet info, next offset) of the file current_path, and None
+# every poll_interval seconds without new packets. A partial last record is read again once it is complete
+class PcapFollower:
+    def __init__(self, pattern, engine, start_file=None, start=None, first_no=1, poll_interval=0.5,
+                 idle_timeout=None):
+        self.pattern = pattern
+        self.engine = engine
+        self.current_path = start_file
+        self.start = start
+        self.first_no = first_no
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+    # Get the first file written after the current one, None if there is none
+    def next_file(self):
+        files = get_follow_files(self.pattern)
+        if self.current_path is None:
+            return files[0] if files else None
+        if self.current_path in files:
+            index = files.index(self.current_path)
+            return files[index + 1] if index + 1 < len(files) else None
+        return None
+
+    # Open the current file, None if its header has not been written yet
+    def open_reader(self):
+        try:
+            return pcapFast.open_reader(self.current_path)
+        except pcapFast.PcapFormatError:
+            if os.path.getsize(self.current_path) < pcapFast.PCAP_HEADER_LEN:
+                return None
+            raise
+
+    def __iter__(self):
+        n = self.first_no
+        offset = self.start
+        reader = None
+        fast = self.engine == 'fast'
+        last_packet_time = time.monotonic()
+        try:
+            while True:
+                if self.current_path is None:
+                    self.current_path = self.next_file()
+                if reader is None and self.current_path is not None:
+                    reader = self.open_reader()
+                    if reader is not None and offset is not None:
+                        reader.seek(offset)
+
+                new_packets = False
+                if reader is not None:
+                    for _, sec, usec, data in reader.records():
+                        yield (n, pcapFast.get_iso_timestamp(sec, usec), len(data),
+                               get_record_info(reader.linktype, data, fast), reader.offset)
+                        n += 1
+                        new_packets = True
+                    # Drop what has been read of a partial record, it is read again at the next poll
+                    reader.seek(reader.offset)
+
+                if new_packets:
+                    last_packet_time = time.monotonic()
+                    continue
+
+                next_path = self.next_file() if reader is not None else None
+                if next_path is not None:
+                    reader.close()
+                    reader = None
+                    offset = None
+                    self.current_path = next_path
+                    continue
+
+                if self.idle_timeout is not None and time.monotonic() - last_packet_time >= self.idle_timeout:
+                    return
+                yield None
+                time.sleep(self.poll_interval)
+        finally:
+            if reader is not None:
+                reader.close()
+
+
+# Get the bucket of a rollup frequency from an ISO timestamp of the ingest, that is always in UTC
+ROLLUP_BUCKETS = {
+    '1s': lambda ts: ts[:19] + '+00:00',
+    '1min': lambda ts: ts[:16] + ':00+00:00',
+}
+
+
+# Keep the packets count and the bytes sum of every bucket split by transport and private/public destination,
+# write() adds them to the rollup tables {freq: table name}
+class RollupAccumulator:
+    def __init__(self, tables):
+        self.tables = tables
+        self.buckets = {freq: {} for freq in tables}
+        self._private_ips = {}
+
+    def is_private(self, ip):
+        private = self._private_ips.get(ip)
+        if private is None:
+            private = self._private_ips[ip] = ipaddress.ip_address(ip).is_private
+        return private
+
+    def add(self, ts, transport, dst, length):
+        private = self.is_private(dst)
+        for freq, buckets in self.buckets.items():
+            key = (ROLLUP_BUCKETS[freq](ts), transport, private)
+            values = buckets.get(key)
+            if values is None:
+                buckets[key] = [1, length]
+            else:
+                values[0] += 1
+                values[1] += length
+
+    # Add the buckets to the rollup tables, it does not commit
+    def write(self, conn):
+        for freq, buckets in self.buckets.items():
+            conn.executemany(f'INSERT INTO {self.tables[freq]} VALUES (?, ?, ?, ?, ?) '
+                             f'ON CONFLICT (bucket, transport, private) DO UPDATE SET '
+                             f'packets = packets + excluded.packets, bytes = bytes + excluded.bytes',
+                             [key + tuple(values) for key, values in buckets.items()])
+            buckets.clear()
+
+
+# Create the rollup tables {freq: table name} of the packets table raw_table. The rollups that are not in the coverage
+# table, because they are new or were written by a version without it, are filled again from the rows already in
+# raw_table and then added to it, the charts use only the rollups in it
+def create_rollup_tables(conn, tables, raw_table, batch_size=100000):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {sharedUtils.ROLLUP_COVERAGE_TABLE} '
+                 f'(rollup TEXT PRIMARY KEY, updated TIMESTAMP)')
+    complete = {row[0] for row in conn.execute(f'SELECT rollup FROM {sharedUtils.ROLLUP_COVERAGE_TABLE}')}
+    for table in tables.values():
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (bucket TIMESTAMP, transport TEXT, private INT, '
+                     f'packets INT, bytes INT, PRIMARY KEY (bucket, transport, private))')
+
+    missing = {freq: table for freq, table in tables.items() if table not in complete}
+    if missing:
+        if conn.execute(f'SELECT 1 FROM {raw_table} LIMIT 1').fetchone():
+            print(f'Filling the rollups {", ".join(missing.values())} from the rows of {raw_table}')
+        for table in missing.values():
+            conn.execute(f'DELETE FROM {table}')
+        fill_rollup_tables(conn, missing, raw_table, batch_size)
+        updated = datetime.now(timezone.utc).isoformat()
+        conn.executemany(f'INSERT OR REPLACE INTO {sharedUtils.ROLLUP_COVERAGE_TABLE} VALUES (?, ?)',
+                         [(table, updated) for table in missing.values()])
+    conn.commit()
+
+
+# Add the rows of raw_table to the rollup tables {freq: table name}, batch_size rows at a time, it does not commit
+def fill_rollup_tables(conn, tables, raw_table, batch_size):
+    rollups = RollupAccumulator(tables)
+    cursor = conn.execute(f'SELECT timestamp, transport, dst, length FROM {raw_table}')
+    for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+        for row in rows:
+            rollups.add(*row)
+        rollups.write(conn)
+
+
+# Drop the rollup tables {freq: table name} and their coverage
+def drop_rollup_tables(conn, tables):
+    for table in tables.values():
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+    conn.execute(f'DROP TABLE IF EXISTS {sharedUtils.ROLLUP_COVERAGE_TABLE}')
+    conn.commit()
+
+
+# Create the tables of the ingest checkpoint and of the DNS hostnames seen so far, the hostname of an IP is the first
+# one seen in the DNS answers and first_seen is the timestamp of that answer
+def create_checkpoint_tables(conn):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} '
+                 f'(pcap TEXT PRIMARY KEY, last_no INT, offset INT, updated TIMESTAMP, header_hash TEXT, '
+                 f'header_size INT)')
+    checkpoint_columns = [column[1] for column in conn.execute(f'PRAGMA table_info({CHECKPOINT_TABLE})')]
+    for column, column_type in (('header_hash', 'TEXT'), ('header_size', 'INT')):
+        if column not in checkpoint_columns:
+            conn.execute(f'ALTER TABLE {CHECKPOINT_TABLE} ADD COLUMN {column} {column_type}')
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {DNS_TABLE} (ip TEXT PRIMARY KEY, hostname TEXT, first_seen TIMESTAMP)')
+    if 'first_seen' not in [column[1] for column in conn.execute(f'PRAGMA table_info({DNS_TABLE})')]:
+        conn.execute(f'ALTER TABLE {DNS_TABLE} ADD COLUMN first_seen TIMESTAMP')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {DNS_TABLE}_hostname ON {DNS_TABLE} (hostname)')
+    conn.commit()
+
+
+# Drop the checkpoint tables
+def drop_checkpoint_tables(conn):
+    conn.execute(f'DROP TABLE IF EXISTS {CHECKPOINT_TABLE}')
+    conn.execute(f'DROP TABLE IF EXISTS {DNS_TABLE}')
+    conn.commit()
+
+
+# Get the (hash, size) of the first size bytes of a file, the size is smaller if the file is shorter
+def get_header_hash(pcap_path, size=HEADER_HASH_SIZE):
+    with open(pcap_path, 'rb') as f:
+        header = f.read(size)
+    return hashlib.sha256(header).hexdigest(), len(header)
+
+
+# Get the checkpoint of a pcap file: (last No, offset of the next record, DNS hostnames), None if there is none. The
+# checkpoint is of the absolute path of the file, and it is ignored if the start of the file is not the one it saw
+def load_checkpoint(conn, pcap_path):
+    row = conn.execute(f'SELECT last_no, offset, header_hash, header_size FROM {CHECKPOINT_TABLE} WHERE pcap = ?',
+                       (os.path.abspath(pcap_path),)).fetchone()
+    if row is None:
+        # The checkpoints saved before the hashes were keyed by the name of the file
+        row = conn.execute(f'SELECT last_no, offset, header_hash, header_size FROM {CHECKPOINT_TABLE} '
+                           f'WHERE pcap = ? AND header_hash IS NULL', (os.path.basename(pcap_path),)).fetchone()
+    if row is None or row[2] is not None and get_header_hash(pcap_path, row[3]) != (row[2], row[3]):
+        return None
+    dns_hostnames = dict(conn.execute(f'SELECT ip, hostname FROM {DNS_TABLE}').fetchall())
+    return row[0], row[1], dns_hostnames
+
+
+# Get the checkpoint of the last followed file that has one: (file, last No, offset, DNS hostnames) or None
+def load_follow_checkpoint(conn, pattern):
+    for path in reversed(get_follow_files(pattern)):
+        checkpoint = load_checkpoint(conn, path)
+        if checkpoint is not None:
+            return (path,) + checkpoint
+    return None
+
+
+# Save the checkpoint of a pcap file and the (ip, hostname, first seen) added since the last one, it does not commit
+def save_checkpoint(conn, pcap_path, last_no, offset, new_hostnames):
+    conn.execute(f'INSERT OR REPLACE INTO {CHECKPOINT_TABLE} '
+                 f'(pcap, last_no, offset, updated, header_hash, header_size) VALUES (?, ?, ?, ?, ?, ?)',
+                 (os.path.abspath(pcap_path), last_no, offset, datetime.now(timezone.utc).isoformat())
+                 + get_header_hash(pcap_path))
+    conn.execute(f'DELETE FROM {CHECKPOINT_TABLE} WHERE pcap = ? AND header_hash IS NULL',
+                 (os.path.basename(pcap_path),))
+    conn.executemany(f'INSERT OR IGNORE INTO {DNS_TABLE} (ip, hostname, first_seen) VALUES (?, ?, ?)', new_hostnames)
@@ -1,4 +1,9 @@
 import scapy.all as scapy
+from scapy.layers.dns import DNS, DNSRR
+
+DNS_PORT = 53
+# A and AAAA records
+DNS_ADDRESS_TYPES = (1, 28)
 
 
 def get_protocol_and_ports(transport):
@@ -15,3 +20,55 @@ def get_ip_layer(pkt):
     if pkt.haslayer(scapy.IPv6):
         return scapy.IPv6
     return None
+
+
+# Get the answers of a DNS layer, older scapy versions chain them with the payload instead of a list
+def get_dns_rrs(dns):
+    if isinstance(dns.an, list):
+        return dns.an[:dns.ancount]
+    rrs = []
+    rr = dns.an
+    while isinstance(rr, DNSRR) and len(rrs) < dns.ancount:
+        rrs.append(rr)
+        rr = rr.payload
+    return rrs
+
+
+# Get the (ip, hostname) pairs of the DNS A and AAAA answers
+def get_dns_answers(pkt):
+    answers = []
+    if not pkt.haslayer(DNS):
+        return answers
+    dns = pkt[DNS]
+    if getattr(dns, 'ancount', 0) > 0 and dns.an is not None:
+        for rr in get_dns_rrs(dns):
+            try:
+                if rr.type in DNS_ADDRESS_TYPES:
+                    rrname = rr.rrname.decode('utf-8') if isinstance(rr.rrname, bytes) else str(rr.rrname)
+                    if rrname.endswith('.'):
+                        rrname = rrname[:-1]
+                    answers.append((str(rr.rdata), rrname))
+            except Exception:
+                pass  # Ignore malformed RR
+    return answers
+
+
+# Dissect a packet with scapy, same output of pcapFast.decode_packet:
+# None if it is not an IP packet, otherwise (src, sport, dst, dport, transport, flags, dns_answers)
+def get_packet_info(pkt):
+    ip_type = get_ip_layer(pkt)
+    if not ip_type:
+        return None
+
+    ip = pkt[ip_type]
+    transport = ip.payload
+    protocol, sport, dport = get_protocol_and_ports(transport)
+    flags = str(transport.flags) if protocol == 'TCP' else None
+    dns_answers = get_dns_answers(transport) if protocol in ('TCP', 'UDP') and DNS_PORT in (sport, dport) else []
+
+    return ip.src, sport, ip.dst, dport, protocol, flags, dns_answers
+
+
+# Dissect the raw bytes of a frame with the scapy layer of its link type
+def dissect_raw(linktype, data):
+    return scapy.conf.l2types.get(linktype, scapy.conf.raw_layer)(data)
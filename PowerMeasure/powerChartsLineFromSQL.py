@@ -4,21 +4,17 @@ import sys
 _path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(_path_parent)
 
-import matplotlib
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-
 from Utility import sharedUtils
 
 # Parse config file
 config_path = os.path.join(_path_parent, 'config.ini')
-sharedUtils.set_matplotlib_backend(matplotlib, config_path)
 file_end = sharedUtils.get_file_end_from_config(config_path)
 fields, table_name, where_data = sharedUtils.get_chart_config_from_file(config_path, 'POWER')
 
 # Parse command line arguments
 parser = sharedUtils.get_basic_parser('Plot power data from SQL', file_end, default_color='green')
 parser.add_argument('--power_sum', help='Show power sum on y axis. Default is power mean', action='store_true')
+sharedUtils.parser_add_requery_args(parser)
 args = parser.parse_args()
 
 # Get the DB files
@@ -29,29 +25,21 @@ else:
 
 sharedUtils.validate_args(args)
 
-# Create the datasets
-datasets = []
-for db_path in args.db:
-    data = sharedUtils.get_data_from_db(db_path, fields, table_name, args.start, args.end, where_data, args.h24)
+# Import matplotlib and the modules that use numpy and pandas once the arguments are valid, they are slow to import
+import matplotlib
 
-    if data:
-        data = data if not args.h24 else sharedUtils.data_start_from_midnight(data)
-        df = sharedUtils.get_data_frame_from_data(data, fields, grp_freq=args.grp_freq)
+sharedUtils.set_matplotlib_backend(matplotlib, config_path, headless=args.output is not None)
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
 
-        if args.power_sum:
-            df = df.sum()
-        else:
-            df = df.mean()
-        df = df.reset_index()
+from Utility import zoomRequery
 
-        datasets.append({
-            'label': sharedUtils.get_file_name_from_path(db_path),
-            'df': df,
-            'first_timestamp': data[0][0],
-            'last_timestamp': data[-1][0]
-        })
-    else:
-        print(f'No data found in {db_path}')
+# Create the datasets, grouping the data inside SQLite when grp_freq allows it
+jobs = [(sharedUtils.get_grouped_data_from_db, db_path,
+         dict(fields=fields, table=table_name, grp_freq=args.grp_freq, aggregate='sum' if args.power_sum else 'mean',
+              start=args.start, end=args.end, where_data=where_data, h24=args.h24)) for db_path in args.db]
+cache = sharedUtils.get_aggregate_cache_from_config(config_path, args.no_cache)
+datasets = sharedUtils.get_datasets_from_dbs(jobs, args.workers, cache)
 
 # Plot the data
 if args.power_sum:
@@ -60,10 +48,22 @@ else:
     y_label = f'Power (W) /{args.grp_freq}'
 if args.line_style == 'None':
     args.line_style = '-'
-sharedUtils.plot_data_from_datasets(plt, 'plot', sharedUtils.get_file_name_from_path(__file__), datasets, fields,
-                                    y_label, no_fill=args.no_fill, line_style=args.line_style, color=args.color,
-                                    marker=args.marker, no_grid=args.no_grid, legend=not args.no_legend, time=args.time,
-                                    h24=args.h24, date_format=mdates.DateFormatter('%H:%M:%S'), grp_freq=args.grp_freq)
+plot_kwargs = dict(plot_f='plot', w_title=sharedUtils.get_file_name_from_path(__file__), fields=fields,
+                   y_label=y_label, no_fill=args.no_fill, line_style=args.line_style, color=args.color,
+                   marker=args.marker, no_grid=args.no_grid, legend=not args.no_legend, time=args.time, h24=args.h24,
+                   date_format=mdates.DateFormatter('%H:%M:%S'), grp_freq=args.grp_freq,
+                   downsample_method=args.downsample, max_points=args.max_points)
+if args.output:
+    name = os.path.splitext(plot_kwargs['w_title'])[0]
+    sharedUtils.save_plots_from_datasets(args.output, name, args.format, datasets, compare=args.h24,
+                                         workers=args.workers, **plot_kwargs)
+    sys.exit()
+fig, ax, artists = sharedUtils.plot_data_from_datasets(plt, datasets=datasets, **plot_kwargs)
+
+# Query again the zoomed window with a finer grp_freq
+if (args.time or args.h24) and not args.no_requery and datasets:
+    requery = zoomRequery.ZoomRequery(fig, ax, datasets, artists, fields, args.grp_freq, args.max_points,
+                                      args.downsample, cache)
 
 # Show plot
 plt.show()
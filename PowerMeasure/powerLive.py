@@ -5,6 +5,8 @@ _path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(_path_parent)
 
 import argparse
+import asyncio
+import math
 import queue
 import re
 import sqlite3
@@ -13,15 +15,20 @@ import time
 from abc import ABC, abstractmethod
 from datetime import datetime
 
-import matplotlib
-import matplotlib.pyplot as plt
-import requests
-from matplotlib.animation import FuncAnimation
+from Utility import sampleScheduler, sharedUtils
 
-from Utility import sharedUtils
+# requests is imported when a plug is created and matplotlib when the graph is shown, they are slow to import
+requests = sharedUtils.lazy_import('requests')
 
 config_path = os.path.join(_path_parent, 'config.ini')
-sharedUtils.set_matplotlib_backend(matplotlib, config_path)
+
+# Default rows and seconds after which the readings written by a PowerWriter are committed
+BATCH_SIZE = 100
+COMMIT_INTERVAL = 1.0
+# Default seconds shown by the live graph, points of the overview of all the capture and seconds between its updates
+WINDOW = 300
+OVERVIEW_POINTS = 2000
+OVERVIEW_REFRESH = 5
 
 
 class Plug(ABC):
@@ -32,7 +39,7 @@ class Plug(ABC):
         pass
 
     @abstractmethod
-    def get_load(self) -> float:
+    def get_load(self, timeout=None) -> float:
         pass
 
     @abstractmethod
@@ -55,8 +62,8 @@ class ShellyPlugS(Plug):
     def name(self):
         return 'Shelly Plug S'
 
-    def get_load(self):
-        return self.session.get(self._url_load).json()['power']
+    def get_load(self, timeout=None):
+        return self.session.get(self._url_load, timeout=timeout).json()['power']
 
     def turn_on(self):
         self.session.get(f'http://{self.ip}/settings?led_status_disable=false')
@@ -78,8 +85,8 @@ class NetioPowerCableRest101(Plug):
     def name(self):
         return 'Netio Power Cable REST 101'
 
-    def get_load(self):
-        return self.session.get(self._url_load).json()['Outputs'][0]['Load']
+    def get_load(self, timeout=None):
+        return self.session.get(self._url_load, timeout=timeout).json()['Outputs'][0]['Load']
 
     def turn_on(self):
         return self.session.post(f'http://{self.ip}/netio.json',
@@ -90,14 +97,17 @@ class NetioPowerCableRest101(Plug):
                                  json={'Outputs': [{'ID': 1, 'Action': 0}]}).status_code == 200
 
 
-class PowerLive:
-    def __init__(self, plug: Plug, db_name, db_reset=False, no_graph=False, n_threads=3, captures_limit=None,
-                 interval=1000, verbose=False):
-        self.plug = plug
-        self.verbose = verbose
-        self.captures_limit = captures_limit
-        self.captures = 0
+# Read the load of a plug as {timestamp field: ISO timestamp, load field: load}, the timestamp is the middle of the
+# request since the plug measures the load between its start and its end
+def read_load(plug, fields, timeout=None):
+    start_time = datetime.utcnow()
+    load = plug.get_load(timeout)
+    return {fields[0]: (start_time + (datetime.utcnow() - start_time) / 2).isoformat(), fields[1]: load}
+
 
+# The DB of the loads of a plug, the table is created if it does not exist
+class PowerDB:
+    def __init__(self, db_name, db_reset=False, int_timestamps=False):
         self.file_end = sharedUtils.get_file_end_from_config(config_path)
         self.fields, self.table_name, _ = sharedUtils.get_chart_config_from_file(config_path, 'POWER')
 
@@ -108,97 +118,391 @@ class PowerLive:
         if db_reset:
             self.cur.execute('DROP TABLE IF EXISTS ' + self.table_name)
             self.conn.commit()
-            print('Deleted all rows from table')
+            print(f'Deleted all rows from table of {self.db_name}')
 
+        int_timestamps_columns = ', ' + sharedUtils.INT_TIMESTAMPS_COLUMNS if int_timestamps else ''
         try:
             self.cur.execute(
-                'CREATE TABLE ' + self.table_name + ' (timestamp TIMESTAMP PRIMARY KEY, load REAL)')
+                'CREATE TABLE ' + self.table_name + ' (timestamp TIMESTAMP PRIMARY KEY, load REAL'
+                + int_timestamps_columns + ')')
             self.conn.commit()
-            print('Created table')
+            if int_timestamps:
+                sharedUtils.create_int_timestamps_indexes(self.conn, self.table_name)
+            print(f'Created table of {self.db_name}')
         except sqlite3.OperationalError:
-            pass
-        self._sql_query = 'INSERT INTO ' + self.table_name + ' VALUES (?, ?)'
+            if int_timestamps and not sharedUtils.has_int_timestamps(self.db_name, self.table_name, self.conn):
+                sharedUtils.add_int_timestamps(self.conn, self.table_name)
+                print(f'Added the integer timestamps to the table of {self.db_name}')
+        self.int_timestamps = sharedUtils.has_int_timestamps(self.db_name, self.table_name, self.conn)
+        self._sql_query = 'INSERT INTO ' + self.table_name + (' VALUES (?, ?, ?, ?)' if self.int_timestamps
+                                                               else ' VALUES (?, ?)')
 
         print(f'Data will be saved to {self.db_name}')
 
+    # Insert a reading {timestamp field: ISO timestamp, load field: load}, it is saved by commit()
+    def insert(self, data):
+        row = (data[self.fields[0]], data[self.fields[1]])
+        if self.int_timestamps:
+            row += sharedUtils.get_int_timestamps(row[0])
+        self.cur.execute(self._sql_query, row)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class PowerLive:
+    def __init__(self, plug: Plug, db_name, db_reset=False, no_graph=False, n_threads=3, captures_limit=None,
+                 interval=1000, verbose=False, int_timestamps=False, batch_size=BATCH_SIZE,
+                 commit_interval=COMMIT_INTERVAL, window=WINDOW, timeout=None):
+        self.plug = plug
+        self.verbose = verbose
+        # A request can take up to an interval for every thread before the ticks are missed
+        self.timeout = timeout if timeout is not None else n_threads * interval / 1000
+        self.captures_limit = captures_limit
+        self.captures = 0
+
+        self.db = PowerDB(db_name, db_reset, int_timestamps)
+        self.fields = self.db.fields
+        self.db_name = self.db.db_name
+
         if not self.plug.turn_on():
+            self.db.close()
             sys.exit('Failed to turn on plug')
 
+        # The ticks of the scheduler are taken by the first free thread, a tick is missed if none is free. A None stops
+        # the threads
         start = queue.Queue()
-        self._lock = threading.Lock()
+        self.scheduler = sampleScheduler.SampleScheduler(interval / 1000)
+        self.writer = PowerWriter([self.db], batch_size, commit_interval)
+        self._stop = threading.Event()
         if not no_graph:
-            init_data = self.get_data()
-            self.x1 = [1.0]
-            self.y1 = [init_data[self.fields[1]]]
-            self.send_to_sql(init_data)
+            import matplotlib
+
+            sharedUtils.set_matplotlib_backend(matplotlib, config_path)
+            import matplotlib.pyplot as plt
+            from matplotlib.animation import FuncAnimation
+
+            from Utility import ringBuffer
 
-            self.fig, self.ax1 = plt.subplots()
+            # The live graph shows the last window seconds from a buffer of fixed size, the overview all the capture
+            # decimated to OVERVIEW_POINTS, so a frame takes the same time however long the capture runs
+            self.window = window
+            self.live = ringBuffer.RingBuffer(math.ceil(window * 1000 / interval) + n_threads)
+            self.overview = ringBuffer.DecimatedHistory(OVERVIEW_POINTS)
+            self._overview_time = -OVERVIEW_REFRESH
+            self._graph_lock = threading.Lock()
+
+            self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, gridspec_kw=dict(height_ratios=[3, 1]))
             self.fig.suptitle(f'{self.plug.name} Power Live [{datetime.utcnow()}] (UTC)')
             self.ax1.set_xlabel(f'Time (s) / Interval: {interval}ms')
             self.ax1.set_ylabel('Power (W)')
+            self.ax1.set_xlim(-window, 0)
             self.ax1.grid()
             self.ln1, = self.ax1.plot([], [], 'g-')
+            self.ax2.set_xlabel('Elapsed time (s)')
+            self.ax2.set_ylabel('Power (W)')
+            self.ax2.grid()
+            self.ln2, = self.ax2.plot([], [], 'g-', linewidth=0.8)
+            self.fig.tight_layout()
 
-            for _ in range(n_threads):
-                threading.Thread(target=self.update, args=(start,), daemon=True).start()
-            self.ani = FuncAnimation(self.fig, start.put, interval=interval)
+            threads = self.start_threads(self.update, start, n_threads)
+            threading.Thread(target=self.schedule, args=(start,), daemon=True).start()
+            # Only the live line is redrawn on every frame, the rest of the figure when its limits change
+            self.ani = FuncAnimation(self.fig, self.draw_graph, interval=interval, blit=True, cache_frame_data=False)
 
             fig_manager = plt.get_current_fig_manager()
             fig_manager.set_window_title(sharedUtils.get_file_name_from_path(self.db_name))
 
             plt.show()
         else:
-            for _ in range(n_threads):
-                threading.Thread(target=self.worker_no_graph, args=(start,), daemon=True).start()
-            while True:
-                start.put(True)
-                time.sleep(interval / 1000)
+            threads = self.start_threads(self.worker_no_graph, start, n_threads)
+            try:
+                self.schedule(start)
+            except KeyboardInterrupt:
+                pass
+        self.stop(start, threads)
+
+    @staticmethod
+    def start_threads(target, start, n_threads):
+        threads = [threading.Thread(target=target, args=(start,), daemon=True) for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    # Give the ticks of the scheduler to the threads, at absolute deadlines so the sampling does not drift, until the
+    # capture is stopped
+    def schedule(self, start):
+        for tick in self.scheduler.ticks():
+            if self._stop.is_set():
+                return
+            # Only this thread puts the ticks, so the queue cannot fill up between the check and the put
+            if start.qsize():
+                self.scheduler.stats.add_missed()
+            else:
+                start.put(tick)
+
+    # Stop the capture, wait for the requests still running and write all the data before closing the DB. A request
+    # still running after the timeout is not waited for, requests applies it to every read of a slow response
+    def stop(self, start, threads):
+        self._stop.set()
+        start.put(None)
+        deadline = time.monotonic() + self.timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self.writer.close()
+        print(self.scheduler.stats.summary())
+
+    # Get the next tick for a thread, None if the capture is stopped. The None is put back for the other threads
+    def get_tick(self, start):
+        tick = start.get()
+        if tick is None:
+            start.put(None)
+        elif self.check_captures_limit():
+            self._stop.set()
+            tick = None
+        return tick
 
     def get_data(self):
-        data = {self.fields[0]: datetime.utcnow().isoformat(), self.fields[1]: self.plug.get_load()}
+        data = read_load(self.plug, self.fields, self.timeout)
         self.captures += 1
         if self.verbose:
             print(f'[#{self.captures}]{data}')
 
         return data
 
-    def update(self, start):
-        while True:
-            start.get()
-            self.check_captures_limit()
+    # Get the data of a tick (tick, deadline) of the scheduler and add the jitter and the latency of the request to the
+    # stats. Return the data and the seconds from the start of the scheduler to the middle of the request, None if the
+    # request failed
+    def sample(self, tick):
+        request_start = time.monotonic()
+        try:
             data = self.get_data()
-            self.update_full_graph(data)
-            self.send_to_sql(data)
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            print(e)
+            data = None
+        request_end = time.monotonic()
+        self.scheduler.stats.add(request_start - tick[1], request_end - request_start, data is None)
 
-    def update_full_graph(self, data):
-        self.x1.append(self.x1[-1] + self.ani._interval / 1000)
-        self.y1.append(data[self.fields[1]])
-        self.ln1.set_data(self.x1, self.y1)
-        self.ax1.relim()
-        self.ax1.autoscale_view()
+        return data, (request_start + request_end) / 2 - self.scheduler.start
 
+    def update(self, start):
+        while True:
+            tick = self.get_tick(start)
+            if tick is None:
+                return
+            data, x = self.sample(tick)
+            if data is not None:
+                self.update_graph(data, x)
+                self.send_to_sql(data)
+
+    # Add the data at x seconds from the start to the live graph and to the overview
+    def update_graph(self, data, x):
+        with self._graph_lock:
+            self.live.append(x, data[self.fields[1]])
+            self.overview.append(x, data[self.fields[1]])
+
+    # Draw the last window seconds ending now. The y limits fit the visible data only when it goes out of them or
+    # takes less than a quarter of them, and the overview is updated every OVERVIEW_REFRESH seconds, as both need a
+    # draw of all the figure
+    def draw_graph(self, _frame):
+        # Close the graph from the main thread when the capture is stopped by the captures limit
+        if self._stop.is_set():
+            import matplotlib.pyplot as plt
+
+            plt.close(self.fig)
+            return []
+        now = time.monotonic() - self.scheduler.start
+        with self._graph_lock:
+            x, y = self.live.get()
+        x = x - now
+        self.ln1.set_data(x, y)
+
+        redraw = False
+        visible = y[x >= -self.window]
+        if len(visible):
+            low, high = visible.min(), visible.max()
+            margin = max((high - low) / 10, 1)
+            y_low, y_high = self.ax1.get_ylim()
+            if low < y_low or high > y_high or high - low + 2 * margin < (y_high - y_low) / 4:
+                self.ax1.set_ylim(low - margin, high + margin)
+                redraw = True
+
+        if now - self._overview_time >= OVERVIEW_REFRESH and self.overview.count:
+            with self._graph_lock:
+                self.ln2.set_data(*self.overview.get())
+            self.ax2.relim()
+            self.ax2.autoscale_view()
+            self._overview_time = now
+            redraw = True
+
+        if redraw:
+            self.fig.canvas.draw()
+        return [self.ln1]
+
+    # Queue the data to be written by the writer thread, the threads reading the plug do not wait for the disk
     def send_to_sql(self, data):
-        with self._lock:
-            try:
-                self.cur.execute(self._sql_query, (data[self.fields[0]], data[self.fields[1]]))
-                self.conn.commit()
-            except sqlite3.OperationalError as e:
-                print(e)
+        self.writer.write(self.db, data)
 
     def worker_no_graph(self, start):
         while True:
-            start.get()
-            self.check_captures_limit()
-            data = self.get_data()
-            self.send_to_sql(data)
+            tick = self.get_tick(start)
+            if tick is None:
+                return
+            data, _ = self.sample(tick)
+            if data is not None:
+                self.send_to_sql(data)
 
     def check_captures_limit(self):
         if self.captures_limit is not None and self.captures >= self.captures_limit:
-            print('Captures limit reached')
-            os._exit(1)
+            if not self._stop.is_set():
+                print('Captures limit reached')
+            return True
+        return False
+
+
+# Write the readings of many plugs to their DBs from a thread, so the threads reading the plugs do not wait for the
+# disk. write() queues a reading, the thread inserts the readings and commits them together once batch_size rows are
+# pending or commit_interval seconds after the first of them. close() writes the queued readings and closes the DBs
+class PowerWriter:
+    def __init__(self, dbs, batch_size=BATCH_SIZE, commit_interval=COMMIT_INTERVAL):
+        self.dbs = dbs
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_queued, daemon=True)
+        self._thread.start()
+
+    def write(self, db: PowerDB, data):
+        self._queue.put((db, data))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        for db in self.dbs:
+            db.close()
+
+    def _write_queued(self):
+        pending = set()
+        rows = 0
+        deadline = None
+        while True:
+            try:
+                item = self._queue.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = ()
+            if item:
+                db, data = item
+                try:
+                    db.insert(data)
+                    pending.add(db)
+                    rows += 1
+                    if deadline is None:
+                        deadline = time.monotonic() + self.commit_interval
+                except sqlite3.OperationalError as e:
+                    print(f'{db.db_name}: {e}')
+
+            if pending and (item is None or rows >= self.batch_size or time.monotonic() >= deadline):
+                for db in pending:
+                    try:
+                        db.commit()
+                    except sqlite3.OperationalError as e:
+                        print(f'{db.db_name}: {e}')
+                pending.clear()
+                rows = 0
+                deadline = None
+            if item is None:
+                return
+
+
+# Poll the loads of many plugs at the same time from one process with asyncio, every one every interval ms from the same
+# start so their samples stay aligned. The blocking requests run in a pool with a thread for every plug and a reading
+# that takes more than timeout seconds, the interval by default, is skipped. The request keeps running in its thread, so
+# the ticks of the plug are missed until it ends and a plug never takes the thread of another one. A plug is polled
+# captures_limit times, the skipped readings and the missed ticks count, and the stats of the sampling of all of them
+# are printed at the end. All the readings are written by one PowerWriter to the DB of their plug, dbs[i] for plugs[i]
+class PowerCollector:
+    def __init__(self, plugs, dbs, captures_limit=None, interval=1000, timeout=None, verbose=False,
+                 batch_size=BATCH_SIZE, commit_interval=COMMIT_INTERVAL):
+        self.plugs = plugs
+        self.dbs = dbs
+        self.writer = PowerWriter(dbs, batch_size, commit_interval)
+        self.captures_limit = captures_limit
+        self.captures = [0] * len(plugs)
+        self.interval = interval / 1000
+        self.timeout = timeout if timeout is not None else self.interval
+        self.verbose = verbose
+        self.scheduler = sampleScheduler.SampleScheduler(self.interval)
 
-    def __del__(self):
-        self.conn.close()
+    def run(self):
+        try:
+            asyncio.run(self.collect())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.writer.close()
+        print(self.scheduler.stats.summary())
+
+    async def collect(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=len(self.plugs)) as executor:
+            turned_on = await asyncio.gather(*[loop.run_in_executor(executor, plug.turn_on) for plug in self.plugs],
+                                             return_exceptions=True)
+            polled = []
+            for i, result in enumerate(turned_on):
+                if result is True:
+                    polled.append(i)
+                else:
+                    print(f'Failed to turn on plug of {self.dbs[i].db_name}: {result}')
+            if not polled:
+                sys.exit('Failed to turn on the plugs')
+
+            # The loop time is the monotonic clock
+            self.scheduler.start = loop.time()
+            await asyncio.gather(*[self.poll(i, loop, executor) for i in polled])
+
+    async def poll(self, i, loop, executor):
+        plug, db = self.plugs[i], self.dbs[i]
+        tick = 0
+        polls = 0
+        request = None
+        while self.captures_limit is None or polls < self.captures_limit:
+            polls += 1
+            if request is not None and not request.done():
+                print(f'{db.db_name}: the request that timed out is still running, tick missed')
+                self.scheduler.stats.add_missed()
+            else:
+                data = None
+                request_start = loop.time()
+                request = executor.submit(read_load, plug, db.fields, self.timeout)
+                try:
+                    data = await asyncio.wait_for(asyncio.wrap_future(request), self.timeout)
+                except asyncio.TimeoutError:
+                    print(f'{db.db_name}: no load in {self.timeout}s')
+                except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+                    print(f'{db.db_name}: {e}')
+                else:
+                    self.captures[i] += 1
+                    if self.verbose:
+                        print(f'[{db.db_name} #{self.captures[i]}]{data}')
+                    self.writer.write(db, data)
+                self.scheduler.stats.add(request_start - self.scheduler.get_deadline(tick),
+                                         loop.time() - request_start, data is None)
+
+            # Wait for the next tick of the common schedule, the ones already passed are missed
+            tick = self.scheduler.get_next_tick(tick, loop.time())
+            await asyncio.sleep(self.scheduler.get_deadline(tick) - loop.time())
+
+
+# Create the plug of a type of the command line
+def create_plug(plug_type, ip):
+    if plug_type == 2:
+        return NetioPowerCableRest101(ip)
+    return ShellyPlugS(ip)
 
 
 if __name__ == '__main__':
@@ -210,26 +514,56 @@ if __name__ == '__main__':
 
 
     parser = argparse.ArgumentParser('Plug Power Live')
-    parser.add_argument('--ip', type=ip_type, required=True, help='Plug IP')
-    parser.add_argument('--plug_type', choices=[1, 2], default=1, type=int,
-                        help='1 for Shelly Plug S, 2 for Netio PowerCable REST 101x. Default: 1')
+    parser.add_argument('--ip', type=ip_type, nargs='+', required=True,
+                        help='Plug IP. With more of them they are polled at the same time from one process, with '
+                             '--no_graph, and the data of every plug is saved to the DB <db>_<ip>')
+    parser.add_argument('--plug_type', choices=[1, 2], default=[1], type=int, nargs='+',
+                        help='1 for Shelly Plug S, 2 for Netio PowerCable REST 101x, one for all the plugs or one for '
+                             'every --ip. Default: 1')
     sharedUtils.parser_add_db_args(parser)
+    sharedUtils.parser_add_int_timestamps_args(parser)
     parser.add_argument('--no_graph', action='store_true', help='Do not show graph')
     parser.add_argument('--threads', type=int, default=3, help='Number of threads to use. Default: 3')
     parser.add_argument('--captures_limit', type=int, help='Number of captures to make before exiting')
     parser.add_argument('--interval', type=int, default=1000,
                         help='Interval between captures in milliseconds. Default: 1000')
+    parser.add_argument('--timeout', type=float,
+                        help='Seconds to wait for the load of a plug before skipping the capture. Default: the '
+                             'interval with more --ip, otherwise one interval for every thread')
+    parser.add_argument('--batch_size', type=int, default=BATCH_SIZE,
+                        help=f'Commit the data to the DB every this many rows. Default: {BATCH_SIZE}')
+    parser.add_argument('--commit_interval', type=float, default=COMMIT_INTERVAL,
+                        help='Commit the data to the DB at most this many seconds after it is captured. Default: '
+                             f'{COMMIT_INTERVAL}')
+    parser.add_argument('--window', type=float, default=WINDOW,
+                        help=f'Seconds shown by the live graph, a decimated overview shows all the capture. Default: '
+                             f'{WINDOW}')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose mode, print data to console')
     args = parser.parse_args()
 
-    if args.plug_type == 2:
-        plug_chosen = NetioPowerCableRest101(args.ip)
-    else:
-        plug_chosen = ShellyPlugS(args.ip)
+    if len(args.plug_type) not in (1, len(args.ip)):
+        raise argparse.ArgumentTypeError('Use one --plug_type for all the plugs or one for every --ip')
+    if len(args.ip) > 1 and not args.no_graph:
+        raise argparse.ArgumentTypeError('The graph shows only one plug, use --no_graph with more --ip')
+
+    plugs = [create_plug(plug_type, ip) for plug_type, ip in
+             zip(args.plug_type * len(args.ip) if len(args.plug_type) == 1 else args.plug_type, args.ip)]
+
+    if len(plugs) > 1:
+        # The file end goes after the IP
+        file_end = sharedUtils.get_file_end_from_config(config_path)
+        db_base = args.db[:-len(file_end)] if file_end and sharedUtils.check_file_end(args.db, file_end) else args.db
+        dbs = [PowerDB(f'{db_base}_{ip}', args.db_reset, args.int_timestamps) for ip in args.ip]
+        PowerCollector(plugs, dbs, captures_limit=args.captures_limit, interval=args.interval, timeout=args.timeout,
+                       verbose=args.verbose, batch_size=args.batch_size, commit_interval=args.commit_interval).run()
+        sys.exit()
 
+    plug_chosen = plugs[0]
     if not args.db:
         args.db = plug_chosen.name
 
     PowerLive(plug_chosen, db_name=args.db, db_reset=args.db_reset,
               no_graph=args.no_graph, n_threads=args.threads, captures_limit=args.captures_limit,
-              interval=args.interval, verbose=args.verbose)
+              interval=args.interval, verbose=args.verbose, int_timestamps=args.int_timestamps,
+              batch_size=args.batch_size, commit_interval=args.commit_interval, window=args.window,
+              timeout=args.timeout)
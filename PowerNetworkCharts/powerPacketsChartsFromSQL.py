@@ -1,30 +1,39 @@
+import argparse
 import os
 import sys
 
 _path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(_path_parent)
 
-import matplotlib
-
-import matplotlib.pyplot as plt
-import pandas as pd
-
 from Utility import sharedUtils
 
 # Parse config file
 config_path = os.path.join(_path_parent, 'config.ini')
-sharedUtils.set_matplotlib_backend(matplotlib, config_path)
 file_end = sharedUtils.get_file_end_from_config(config_path)
 power_fields, power_table_name, power_where_data = sharedUtils.get_chart_config_from_file(config_path, 'POWER')
 pkt_fields, pkt_table_name, pkt_where_data = sharedUtils.get_chart_config_from_file(config_path, 'NETWORK')
 fields = [power_fields[1], pkt_fields[1]]
 
 # Parse command line arguments
-parser = sharedUtils.get_basic_parser('Plot power and packet charts from SQL database', file_end)
+parser = sharedUtils.get_basic_parser('Plot power and packet charts from SQL database', file_end,
+                                      multiple_grp_freq=True)
 parser.add_argument('--power_sum', help='Use power sum. Default is power mean', action='store_true')
 parser.add_argument('--bytes', help='Use bytes sum. Default is packets count', action='store_true')
 parser.add_argument('--invert_axis', help='Display on x axe what would normally be displayed n y axe and vice-versa',
                     action='store_true')
+parser.add_argument('--max_lag', type=int, default=0,
+                    help='Show in the legend the lag, up to this number of --grp_freq periods in both directions, with '
+                         'the highest correlation of the packets to the power. Default: 0, no lag search')
+parser.add_argument('--spearman', help='Show also the Spearman correlation in the legend', action='store_true')
+parser.add_argument('--confidence', type=float, default=0.95,
+                    help='Confidence level of the intervals of the correlations. Default: 0.95')
+parser.add_argument('--tolerance',
+                    help='Join a bucket of the power with the nearest bucket of the packets, and vice versa, up to '
+                         'this time apart, like 500ms. Default: only the buckets with the same timestamp')
+parser.add_argument('--fill', choices=sharedUtils.JOIN_FILL_POLICIES, default='drop',
+                    help='What to do with the buckets missing the power or the packets: drop them, count 0 packets '
+                         '(zero) or use the previous value (ffill). The buckets still missing one are dropped. '
+                         'Default: drop')
 args = parser.parse_args()
 
 sharedUtils.validate_args(args)
@@ -35,57 +44,97 @@ if args.db_dir:
 else:
     sharedUtils.check_db_files_exist(args.db)
 
-# Create the datasets
-datasets = []
+# Import matplotlib and the modules that use numpy and pandas once the arguments are valid, they are slow to import
+import matplotlib
+
+sharedUtils.set_matplotlib_backend(matplotlib, config_path, headless=args.output is not None)
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from Utility import correlation, timeJoin
+
+# Check that every --grp_freq can be grouped from the finest one and the --tolerance, they need pandas
+try:
+    base_freq = timeJoin.get_base_freq(args.grp_freq)
+    tolerance = timeJoin.get_tolerance(args.tolerance)
+except argparse.ArgumentTypeError as e:
+    parser.error(str(e))
+
+power_aggregate = 'sum' if args.power_sum else 'mean'
+
+# Load the power and the packets of every DB in parallel once, grouped by the finest --grp_freq inside SQLite when it
+# allows it and reading the packets already grouped by the ingest if possible. The power mean is loaded as count and
+# sum, so every --grp_freq is grouped again from them
+jobs = []
 for db_path in args.db:
-    power_data = sharedUtils.get_data_from_db(db_path, power_fields, power_table_name, args.start, args.end,
-                                              power_where_data, args.h24)
-    pkt_data = sharedUtils.get_data_from_db(db_path, pkt_fields, pkt_table_name, args.start, args.end, pkt_where_data,
-                                            args.h24)
-
-    if power_data and pkt_data:
-        power_df = sharedUtils.get_data_frame_from_data(power_data, power_fields, grp_freq=args.grp_freq)
-        pkt_df = sharedUtils.get_data_frame_from_data(pkt_data, pkt_fields, grp_freq=args.grp_freq)
-
-        if args.power_sum:
-            power_df = power_df.sum()
-        else:
-            power_df = power_df.mean()
-        if args.bytes:
-            pkt_df = pkt_df.sum()
-        else:
-            pkt_df = pkt_df.count()
-
-        power_df = power_df.reset_index()
-        pkt_df = pkt_df.reset_index()
-
-        df_merge = pd.merge(power_df, pkt_df, on=pkt_fields[0], how='inner').dropna().reset_index()
-        label = f'{sharedUtils.get_file_name_from_path(db_path)} ({sharedUtils.get_correlation_dataframe(df_merge, *fields)})'
-        datasets.append({
-            'label': label,
-            'first_timestamp': power_data[0][0],
-            'last_timestamp': power_data[-1][0],
-            'df': df_merge
-        })
-    else:
+    jobs.append((sharedUtils.get_grouped_data_from_db, db_path,
+                 dict(fields=power_fields, table=power_table_name, grp_freq=base_freq,
+                      aggregate='sum' if args.power_sum else sharedUtils.COUNT_SUM, start=args.start, end=args.end,
+                      where_data=power_where_data, h24=args.h24, same_date=False)))
+    jobs.append((sharedUtils.get_grouped_packets_from_db, db_path,
+                 dict(fields=pkt_fields, table=pkt_table_name, grp_freq=base_freq, sum_bytes=args.bytes,
+                      start=args.start, end=args.end, where_data=pkt_where_data, h24=args.h24, same_date=False)))
+cache = sharedUtils.get_aggregate_cache_from_config(config_path, args.no_cache)
+loaded = sharedUtils.load_from_dbs(jobs, args.workers, cache)
+
+# Create the datasets, joining the power and the packets of every --grp_freq and keeping the one with the highest
+# absolute correlation of every DB
+datasets = []
+for db_path, power_grouped, pkt_grouped in zip(args.db, loaded[::2], loaded[1::2]):
+    if not power_grouped or not pkt_grouped:
         print(f'No data found in {db_path}')
+        continue
+    power_base, first_timestamp, last_timestamp = power_grouped
+    db_name = sharedUtils.get_file_name_from_path(db_path)
+
+    best = None
+    for grp_freq in args.grp_freq:
+        power_df = timeJoin.regroup(power_base, power_fields, grp_freq, power_aggregate, base_freq)
+        pkt_df = timeJoin.regroup(pkt_grouped[0], pkt_fields, grp_freq, 'sum', base_freq)
+        df_join, missing = timeJoin.join(power_df, pkt_df, pkt_fields[0], grp_freq, tolerance, args.fill)
+        corr = correlation.get_correlation(df_join, *fields, ts_field=pkt_fields[0], grp_freq=grp_freq,
+                                           max_lag=args.max_lag, confidence=args.confidence)
+        print(f'{db_name} --grp_freq {grp_freq}: {missing} buckets without the power or the packets ({args.fill}), '
+              f'{correlation.format_correlation(corr, grp_freq, args.spearman)}')
+        if best is None or pd.isna(best[2]['pearson']) or abs(corr['pearson']) > abs(best[2]['pearson']):
+            best = grp_freq, df_join, corr
+
+    grp_freq, df_join, corr = best
+    if len(args.grp_freq) > 1:
+        print(f'Best --grp_freq of {db_name}: {grp_freq}')
+        db_name = f'{db_name} {grp_freq}'
+    datasets.append({
+        'label': f'{db_name} ({correlation.format_correlation(corr, grp_freq, args.spearman)})',
+        'first_timestamp': first_timestamp,
+        'last_timestamp': last_timestamp,
+        'df': df_join,
+        'db_path': db_path,
+        'grp_freq': grp_freq
+    })
 
 # Plot the scatter plot
+grp_freq = ', '.join(dict.fromkeys(dataset['grp_freq'] for dataset in datasets)) or args.grp_freq[0]
 if args.power_sum:
-    x_label = f'Power (W) sum/{args.grp_freq}'
+    x_label = f'Power (W) sum/{grp_freq}'
 else:
-    x_label = f'Power (W) /{args.grp_freq}'
+    x_label = f'Power (W) /{grp_freq}'
 if args.bytes:
-    y_label = f'Bytes/{args.grp_freq}'
+    y_label = f'Bytes/{grp_freq}'
 else:
-    y_label = f'Packets/{args.grp_freq}'
+    y_label = f'Packets/{grp_freq}'
 
 if args.invert_axis:
     fields = fields[::-1]
     x_label, y_label = y_label, x_label
-sharedUtils.plot_data_from_datasets(plt, 'scatter', sharedUtils.get_file_name_from_path(__file__), datasets, fields,
-                                    y_label, x_label=x_label, no_fill=True, color=args.color, marker=args.marker,
-                                    no_grid=args.no_grid, legend=not args.no_legend, grp_freq=args.grp_freq,
-                                    keep_xdata=True)
+plot_kwargs = dict(plot_f='scatter', w_title=sharedUtils.get_file_name_from_path(__file__), fields=fields,
+                   y_label=y_label, x_label=x_label, no_fill=True, color=args.color, marker=args.marker,
+                   no_grid=args.no_grid, legend=not args.no_legend, grp_freq=grp_freq, keep_xdata=True,
+                   downsample_method=args.downsample, max_points=args.max_points)
+if args.output:
+    name = os.path.splitext(plot_kwargs['w_title'])[0]
+    sharedUtils.save_plots_from_datasets(args.output, name, args.format, datasets, compare=args.h24,
+                                         workers=args.workers, **plot_kwargs)
+    sys.exit()
+sharedUtils.plot_data_from_datasets(plt, datasets=datasets, **plot_kwargs)
 
 plt.show()
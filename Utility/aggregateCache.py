@@ -0,0 +1,92 @@
+import hashlib
+import os
+import pickle
+
+# Returned by get() when a key is not in the cache, None is a valid cached value
+MISS = object()
+
+# Version of the format of the entries, changing it invalidates all of them
+FORMAT_VERSION = 1
+
+_ENTRY_END = '.pkl'
+
+
+# Get the state of a file, or of the files of a directory like a Parquet dataset, that changes when it is written
+def get_source_state(path):
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+    if os.path.isdir(path):
+        files = []
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                stat = os.stat(os.path.join(dir_path, file_name))
+                files.append((os.path.relpath(os.path.join(dir_path, file_name), path), stat.st_mtime_ns,
+                              stat.st_size))
+        return path, sorted(files)
+    return path, None
+
+
+# Cache of pickled values on disk, like the DataFrames of the aggregated chart data. A key is made from the state of
+# its source files, so a value is not read anymore once they change. When the files take more than max_size bytes the
+# least recently used ones are deleted
+class AggregateCache:
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    # Get the key of a value computed from the source files with the arguments, that have to have a stable repr
+    def get_key(self, sources, *args):
+        state = [get_source_state(os.path.abspath(source)) for source in sources]
+        return hashlib.sha256(repr((FORMAT_VERSION, state, args)).encode()).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + _ENTRY_END)
+
+    # Get the value of a key, MISS if it is not in the cache. An entry that cannot be unpickled, e.g. written by other
+    # versions of pandas or numpy, is deleted
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                try:
+                    value = pickle.load(f)
+                except Exception:
+                    value = MISS
+        except OSError:
+            return MISS
+        if value is MISS:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return MISS
+        # Mark it as used, the eviction deletes the files modified least recently
+        os.utime(path)
+        return value
+
+    # Save the value of a key and evict the least recently used values if the cache is too big
+    def put(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(_ENTRY_END):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
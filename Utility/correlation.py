@@ -0,0 +1,113 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+
+# Get the Pearson correlation coefficient of two arrays, nan if one of them is constant
+def pearson(x, y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x = x - x.mean()
+    y = y - y.mean()
+    denominator = math.sqrt((x * x).sum() * (y * y).sum())
+    return float((x * y).sum() / denominator) if denominator else math.nan
+
+
+# Get the Spearman correlation coefficient of two arrays, the Pearson one of their ranks with the ties averaged
+def spearman(x, y):
+    return pearson(pd.Series(np.asarray(x)).rank().to_numpy(), pd.Series(np.asarray(y)).rank().to_numpy())
+
+
+# Get the confidence interval (low, high) of a correlation coefficient of n pairs with the Fisher transformation.
+# The variance of the Spearman one is bigger, see Fieller, Hartley and Pearson (1957)
+def confidence_interval(r, n, confidence=0.95, spearman=False):
+    if n <= 3 or math.isnan(r):
+        return math.nan, math.nan
+    z = math.atanh(min(max(r, -1 + 1e-12), 1 - 1e-12))
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * math.sqrt((1.06 if spearman else 1) / (n - 3))
+    return math.tanh(z - half_width), math.tanh(z + half_width)
+
+
+# Get sum(a[i] * b[i + lag]) for every lag from -max_lag to max_lag with the FFT
+def _lagged_sums(a, b, max_lag):
+    size = 1 << (2 * len(a) - 1).bit_length()
+    sums = np.fft.irfft(np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size), size)
+    return np.concatenate((sums[size - max_lag:], sums[:max_lag + 1]))
+
+
+# Get the Pearson correlation of x[t] and y[t + lag] for every lag from -max_lag to max_lag of two arrays of the same
+# length, nan are missing values. Return the lags, the coefficients and the number of pairs of every lag
+def lagged_correlation(x, y, max_lag):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    max_lag = max(0, min(max_lag, len(x) - 1))
+    x_mask = ~np.isnan(x)
+    y_mask = ~np.isnan(y)
+    if not x_mask.any() or not y_mask.any():
+        return np.arange(-max_lag, max_lag + 1), np.full(2 * max_lag + 1, math.nan), np.zeros(2 * max_lag + 1, int)
+
+    # Center the values to keep the sums small, the missing ones are 0 and do not count
+    x = np.where(x_mask, x - x[x_mask].mean(), 0.0)
+    y = np.where(y_mask, y - y[y_mask].mean(), 0.0)
+    x_mask = x_mask.astype(float)
+    y_mask = y_mask.astype(float)
+
+    n = np.rint(_lagged_sums(x_mask, y_mask, max_lag))
+    sum_x = _lagged_sums(x, y_mask, max_lag)
+    sum_y = _lagged_sums(x_mask, y, max_lag)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = _lagged_sums(x, y, max_lag) - sum_x * sum_y / n
+        var_x = _lagged_sums(x * x, y_mask, max_lag) - sum_x * sum_x / n
+        var_y = _lagged_sums(x_mask, y * y, max_lag) - sum_y * sum_y / n
+        r = cov / np.sqrt(var_x * var_y)
+    r[(n < 3) | ~np.isfinite(r)] = math.nan
+
+    return np.arange(-max_lag, max_lag + 1), np.clip(r, -1, 1), n.astype(int)
+
+
+# Get the lag with the highest absolute correlation and its coefficient, (None, nan) if there is none
+def best_lag(lags, r):
+    if np.isnan(r).all():
+        return None, math.nan
+    i = int(np.nanargmax(np.abs(r)))
+    return int(lags[i]), float(r[i])
+
+
+# Get the correlation of two fields of a DataFrame: Pearson and Spearman with their confidence intervals and, with
+# max_lag > 0, the lag in buckets of grp_freq of the ts_field with the highest absolute Pearson correlation.
+# The lags are computed on all the buckets between the first and the last one, the missing ones do not count
+def get_correlation(df, field0, field1, ts_field=None, grp_freq=None, max_lag=0, confidence=0.95):
+    n = len(df)
+    r_pearson = pearson(df[field0], df[field1]) if n > 1 else math.nan
+    r_spearman = spearman(df[field0], df[field1]) if n > 1 else math.nan
+    correlation = {
+        'n': n,
+        'pearson': r_pearson,
+        'pearson_ci': confidence_interval(r_pearson, n, confidence),
+        'spearman': r_spearman,
+        'spearman_ci': confidence_interval(r_spearman, n, confidence, spearman=True),
+        'lag': None,
+        'lag_pearson': math.nan,
+    }
+
+    if max_lag > 0 and n > 1:
+        df = df.set_index(ts_field)[[field0, field1]]
+        df = df.reindex(pd.date_range(df.index[0], df.index[-1], freq=grp_freq))
+        lags, r, _ = lagged_correlation(df[field0].to_numpy(), df[field1].to_numpy(), max_lag)
+        correlation['lag'], correlation['lag_pearson'] = best_lag(lags, r)
+
+    return correlation
+
+
+# Get the text of a correlation for a legend
+def format_correlation(correlation, grp_freq=None, spearman=False):
+    low, high = correlation['pearson_ci']
+    text = f'r={correlation["pearson"]:.3f} [{low:.3f}, {high:.3f}]'
+    if spearman:
+        low, high = correlation['spearman_ci']
+        text += f', rho={correlation["spearman"]:.3f} [{low:.3f}, {high:.3f}]'
+    if correlation['lag'] is not None:
+        text += f', best lag {correlation["lag"]:+d}x{grp_freq} r={correlation["lag_pearson"]:.3f}'
+    return text
@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+# Get the values of x as floats, datetimes as seconds from the first one
+def _to_float(x):
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = pd.Series(x)
+        return (x - x.iloc[0]).dt.total_seconds().to_numpy()
+    return np.asarray(x, dtype=float)
+
+
+# Get the indices of the minimum and of the maximum y of every bucket of consecutive points, in order, with the first
+# and the last point. max_points // 2 buckets of the same size are used, a bucket of missing values keeps one nan to
+# keep the gap in the line
+def min_max_indices(y, max_points):
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return np.arange(n)
+
+    bucket_size = math.ceil((n - 2) / ((max_points - 2) // 2))
+    inner = y[1:-1]
+    padding = (-len(inner)) % bucket_size
+    buckets = np.concatenate((inner, np.full(padding, np.nan))).reshape(-1, bucket_size)
+    nan = np.isnan(buckets)
+    mins = np.where(nan, np.inf, buckets).argmin(axis=1)
+    maxs = np.where(nan, -np.inf, buckets).argmax(axis=1)
+    starts = np.arange(len(buckets)) * bucket_size + 1
+    indices = np.concatenate(([0], starts + mins, starts + maxs, [n - 1]))
+    indices = np.unique(indices)
+
+    return indices[indices < n]
+
+
+# Get the indices of the points kept by Largest-Triangle-Three-Buckets, max_points of them with the first and the last
+# one. Every bucket keeps the point making the largest triangle with the point kept of the previous bucket and the
+# average of the next one, the missing values are kept only in buckets without values
+def lttb_indices(x, y, max_points):
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    x = _to_float(x)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    indices = np.empty(max_points, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_y = y[end:next_end]
+        next_y = next_y[~np.isnan(next_y)]
+        avg_x = x[end:next_end].mean()
+        avg_y = next_y.mean() if len(next_y) else y[a]
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        areas = np.where(np.isnan(areas), -1, areas)
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+
+    return indices
+
+
+# Get the indices of the points of a scatter plot with at most one point for every cell of a grid of about max_points
+# cells, so the isolated points are all kept
+def grid_indices(x, y, max_points):
+    x = _to_float(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    # The points with a missing value are not drawn
+    valid = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if not len(valid):
+        return valid
+    side = max(1, math.isqrt(max_points))
+    cells = []
+    for values in (x[valid], y[valid]):
+        low, high = values.min(), values.max()
+        scale = side / (high - low) if high > low else 0
+        cells.append(np.minimum(((values - low) * scale).astype(int), side - 1))
+    _, indices = np.unique(cells[0] * side + cells[1], return_index=True)
+
+    return valid[np.sort(indices)]
+
+
+# Get the indices of the points to plot of a series, all of them with the method 'none' or if max_points is not positive
+def get_indices(x, y, max_points, method='minmax', scatter=False):
+    if method == 'none' or max_points <= 0:
+        return np.arange(len(y))
+    if scatter:
+        return grid_indices(x, y, max_points)
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    return min_max_indices(y, max_points)
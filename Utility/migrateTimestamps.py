@@ -0,0 +1,46 @@
+import os
+import sys
+
+_path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(_path_parent)
+
+import argparse
+import sqlite3
+import time
+
+from Utility import sharedUtils
+
+# Parse config file
+config_path = os.path.join(_path_parent, 'config.ini')
+file_end = sharedUtils.get_file_end_from_config(config_path)
+_, power_table_name, _ = sharedUtils.get_chart_config_from_file(config_path, 'POWER')
+_, pkt_table_name, _ = sharedUtils.get_chart_config_from_file(config_path, 'NETWORK')
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(
+    description=f'Migrate the DBs to the schema version {sharedUtils.INT_TIMESTAMPS_SCHEMA_VERSION}: add the indexed '
+                f'integer epoch and time of day nanoseconds columns to the {power_table_name} and {pkt_table_name} '
+                f'tables')
+sharedUtils.parser_add_db_dir_args(parser, file_end)
+args = parser.parse_args()
+
+# Get the DB files
+if args.db_dir:
+    args.db = sharedUtils.get_db_paths_from_dirs(args.db_dir, file_end)
+else:
+    sharedUtils.check_db_files_exist(args.db)
+
+# Migrate the tables
+for db_path in args.db:
+    with sqlite3.connect(db_path) as conn:
+        for table_name in (power_table_name, pkt_table_name):
+            if not sharedUtils.get_db_table_columns_obj(db_path, table_name, conn):
+                continue
+            if sharedUtils.has_int_timestamps(db_path, table_name, conn):
+                print(f'{db_path}: {table_name} is already migrated')
+                continue
+
+            _start_time = time.time()
+            sharedUtils.add_int_timestamps(conn, table_name)
+            print(f'{db_path}: migrated {table_name} in {time.time() - _start_time:.2f} seconds')
+    conn.close()
@@ -0,0 +1,161 @@
+import functools
+import importlib.util
+import os
+import shutil
+import sqlite3
+
+NS_PER_DAY = 86400 * 10 ** 9
+TOD_FIELD = 'tod_ns'
+# Table of a DB with the rows written to the Parquet dataset of every table by the ingests that ended
+COVERAGE_TABLE = 'parquet_coverage'
+
+
+# Check if pyarrow is installed. It is optional, it is needed only to write and read the Parquet datasets, and it is
+# imported by the functions that use it since it is slow to import
+@functools.lru_cache(maxsize=None)
+def is_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+# Get the directory of the Parquet dataset of a table of a DB, next to the DB file
+def get_dataset_path(db_path, table):
+    return f'{os.path.splitext(db_path)[0]}_{table}.parquet'
+
+
+# Check if a table of a DB has a Parquet dataset that can be read
+def has_dataset(db_path, table):
+    return is_available() and os.path.isdir(get_dataset_path(db_path, table))
+
+
+# Delete the Parquet dataset of a table of a DB and its rows in the coverage table, it commits
+def drop_dataset(db_path, table, conn):
+    shutil.rmtree(get_dataset_path(db_path, table), ignore_errors=True)
+    try:
+        conn.execute(f'DELETE FROM {COVERAGE_TABLE} WHERE dataset = ?', (table,))
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass
+
+
+# Add the rows written to the dataset of a table by an ingest, once its file is visible, it commits
+def add_dataset_rows(conn, table, rows):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {COVERAGE_TABLE} (dataset TEXT PRIMARY KEY, rows INT)')
+    conn.execute(f'INSERT INTO {COVERAGE_TABLE} VALUES (?, ?) ON CONFLICT (dataset) DO UPDATE SET '
+                 f'rows = rows + excluded.rows', (table, rows))
+    conn.commit()
+
+
+# Check if the dataset of a table has all the rows of the table. It has not if an ingest crashed before its file was
+# visible, while an ingest is running or if some ingests did not write it
+def is_dataset_complete(conn, table):
+    try:
+        coverage = conn.execute(f'SELECT rows FROM {COVERAGE_TABLE} WHERE dataset = ?', (table,)).fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return coverage is not None and coverage[0] == conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+# Get the filter expression of the rows with epoch nanoseconds in ts_range and time of the day nanoseconds in
+# tod_range, both (start, end) with None for no limit. None if there are no limits
+def _get_filter(ts_field, ts_range=(None, None), tod_range=(None, None)):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    ts_type = pa.timestamp('us', 'UTC')
+    conditions = []
+    for field, (start, end), to_scalar in ((ds.field(ts_field), ts_range, lambda ns: pa.scalar(ns // 1000, ts_type)),
+                                           (ds.field(TOD_FIELD), tod_range, lambda ns: ns)):
+        if start is not None:
+            conditions.append(field >= to_scalar(start))
+        if end is not None:
+            conditions.append(field <= to_scalar(end))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+# Read the fields of a Parquet dataset as a DataFrame ordered by the first field, the timestamp. Only the row groups
+# with epoch nanoseconds in ts_range and time of the day nanoseconds in tod_range, both (start, end) with None for no
+# limit, are read
+def read_dataset(dataset_path, fields, ts_range=(None, None), tod_range=(None, None)):
+    import pyarrow.dataset as ds
+
+    table = ds.dataset(dataset_path, format='parquet').to_table(columns=fields,
+                                                                filter=_get_filter(fields[0], ts_range, tod_range))
+    return table.sort_by(fields[0]).to_pandas()
+
+
+# Yield the fields of a Parquet dataset like read_dataset(), as DataFrames of at most batch_size rows in the order of
+# the files, so the dataset is never all in memory. The rows are not sorted across the batches
+def iter_dataset(dataset_path, fields, ts_range=(None, None), tod_range=(None, None), batch_size=100000):
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(dataset_path, format='parquet')
+    for batch in dataset.to_batches(columns=fields, filter=_get_filter(fields[0], ts_range, tod_range),
+                                    batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+# Get the schema of the Parquet files of the network table written by ipPacketsToStatsSQL.py, tod_ns is added to
+# filter the time of the day without reading the timestamps
+def get_pcap_stats_schema():
+    import pyarrow as pa
+
+    return pa.schema([('No', pa.int64()), ('timestamp', pa.timestamp('us', 'UTC')), ('src', pa.string()),
+                      ('sport', pa.int64()), ('dst', pa.string()), ('dport', pa.int64()), ('transport', pa.string()),
+                      ('length', pa.int64()), ('flags', pa.string()), ('hostname', pa.string()),
+                      (TOD_FIELD, pa.int64())])
+
+
+# Write rows with ISO timestamps to a Parquet file of a dataset, one row group every row_group_size rows.
+# The file is hidden from the readers until close(), so a stopped ingest does not leave a broken file in the dataset
+class ParquetRowWriter:
+    def __init__(self, dataset_path, name, schema, row_group_size=100000, ts_field='timestamp'):
+        import pyarrow.parquet as pq
+
+        os.makedirs(dataset_path, exist_ok=True)
+        self.path = os.path.join(dataset_path, f'{name}.parquet')
+        self._tmp_path = os.path.join(dataset_path, f'.{name}.parquet.tmp')
+        self.schema = schema
+        self.row_group_size = max(1, row_group_size)
+        self.ts_field = ts_field
+        self.rows = []
+        self.written = 0
+        self._writer = pq.ParquetWriter(self._tmp_path, schema)
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+
+        if not self.rows:
+            return
+        columns = dict(zip(self.schema.names, zip(*self.rows)))
+        ts = pa.array(columns[self.ts_field], pa.string()).cast(self.schema.field(self.ts_field).type)
+        ts_ns = ts.cast(pa.int64()).to_numpy() * 1000
+        columns[self.ts_field] = ts
+        columns[TOD_FIELD] = pa.array(ts_ns % NS_PER_DAY, pa.int64())
+        arrays = [columns[field.name] if field.name in (self.ts_field, TOD_FIELD) else
+                  pa.array(columns[field.name], field.type) for field in self.schema]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        if self.written:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
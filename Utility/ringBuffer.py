@@ -0,0 +1,73 @@
+import numpy as np
+
+
+# The last size (x, y) points added, in a fixed numeric buffer where the newest point overwrites the oldest one, so
+# adding and reading the points take the same time and memory however long it runs
+class RingBuffer:
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self._data = np.empty((2, size))
+        self._next = 0
+
+    def append(self, x, y):
+        self._data[:, self._next] = x, y
+        self._next = (self._next + 1) % self.size
+        self.count += 1
+
+    # Get the x and the y of the points sorted by x, the points can be added out of order by more threads
+    def get(self):
+        data = self._data[:, :min(self.count, self.size)]
+        order = np.argsort(data[0], kind='stable')
+        return data[0][order], data[1][order]
+
+
+# Overview of all the (x, y) points added in at most max_points points. Every bucket of bucket_size consecutive points
+# keeps its minimum and its maximum, like downsample.min_max_indices, and when the buckets are max_points // 2 the
+# consecutive ones are merged two by two, so bucket_size doubles and the memory stays the same
+class DecimatedHistory:
+    def __init__(self, max_points):
+        self.max_buckets = max(2, max_points // 4 * 2)
+        self.bucket_size = 1
+        self.count = 0
+        # Every bucket is x of the minimum, minimum, x of the maximum, maximum
+        self._buckets = np.empty((self.max_buckets, 4))
+        self._n_buckets = 0
+        self._current = np.empty(4)
+        self._current_count = 0
+
+    def append(self, x, y):
+        if not self._current_count:
+            self._current[:] = x, y, x, y
+        elif y < self._current[1]:
+            self._current[:2] = x, y
+        elif y > self._current[3]:
+            self._current[2:] = x, y
+        self._current_count += 1
+        self.count += 1
+
+        if self._current_count >= self.bucket_size:
+            if self._n_buckets == self.max_buckets:
+                self._merge()
+            self._buckets[self._n_buckets] = self._current
+            self._n_buckets += 1
+            self._current_count = 0
+
+    # Merge the buckets two by two, max_buckets is even so all of them have a pair
+    def _merge(self):
+        pairs = self._buckets.reshape(-1, 2, 4)
+        rows = np.arange(len(pairs))
+        lows = pairs[rows, pairs[:, :, 1].argmin(axis=1), :2]
+        highs = pairs[rows, pairs[:, :, 3].argmax(axis=1), 2:]
+        self._n_buckets = len(pairs)
+        self._buckets[:self._n_buckets] = np.concatenate((lows, highs), axis=1)
+        self.bucket_size *= 2
+
+    # Get the x and the y of the minimums and the maximums of the buckets, with the one not full yet, sorted by x
+    def get(self):
+        buckets = self._buckets[:self._n_buckets]
+        if self._current_count:
+            buckets = np.vstack((buckets, self._current))
+        points = buckets.reshape(-1, 2)
+        order = np.argsort(points[:, 0], kind='stable')
+        return points[order, 0], points[order, 1]
@@ -0,0 +1,94 @@
+import collections
+import math
+import threading
+import time
+
+# Number of the last samples kept to compute the percentiles of the stats
+RECENT_SAMPLES = 10000
+
+
+# Get the p percentile of a sorted list, nan if it is empty
+def _percentile(values, p):
+    if not values:
+        return math.nan
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+# Stats of the sampling, safe to update from more threads. The jitter is the delay of the start of a request from the
+# deadline of its tick and the latency the time from the start to the end of the request. A tick is missed if it is
+# skipped because the previous requests were still running, and late if its request started more than late_after
+# seconds after its deadline. The counts and the maximums are of all the samples, the percentiles of the last ones
+class SampleStats:
+    def __init__(self, late_after, recent=RECENT_SAMPLES):
+        self.late_after = late_after
+        self.samples = 0
+        self.missed = 0
+        self.late = 0
+        self.failed = 0
+        self.max_jitter = 0
+        self.max_latency = 0
+        self.jitter = collections.deque(maxlen=recent)
+        self.latency = collections.deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    # Add a request started jitter seconds after its deadline that took latency seconds, failed if it did not return a
+    # reading
+    def add(self, jitter, latency, failed=False):
+        with self._lock:
+            self.samples += 1
+            self.late += jitter > self.late_after
+            self.failed += failed
+            self.max_jitter = max(self.max_jitter, jitter)
+            self.max_latency = max(self.max_latency, latency)
+            self.jitter.append(jitter)
+            self.latency.append(latency)
+
+    def add_missed(self, ticks=1):
+        with self._lock:
+            self.missed += ticks
+
+    # Get the stats as text, the times in milliseconds
+    def summary(self):
+        with self._lock:
+            jitter = sorted(self.jitter)
+            latency = sorted(self.latency)
+            text = f'Samples: {self.samples}, failed: {self.failed}, missed ticks: {self.missed}, ' \
+                   f'late ticks (>{self.late_after * 1000:.0f}ms): {self.late}'
+            for name, values, maximum in (('jitter', jitter, self.max_jitter),
+                                          ('latency', latency, self.max_latency)):
+                text += f'\n{name} ms: p50 {_percentile(values, 50) * 1000:.1f}, ' \
+                        f'p95 {_percentile(values, 95) * 1000:.1f}, p99 {_percentile(values, 99) * 1000:.1f}, ' \
+                        f'max {maximum * 1000:.1f}'
+        return text
+
+
+# Ticks at the deadlines start + n * interval seconds of the monotonic clock, so they do not drift with the time taken
+# by the work or by the sleeps. The deadlines that passed while the caller was busy are skipped and counted as missed,
+# so the ticks do not pile up. A request is late if it starts more than late_after seconds, half interval by
+# default, after the deadline of its tick
+class SampleScheduler:
+    def __init__(self, interval, late_after=None):
+        self.interval = interval
+        self.stats = SampleStats(late_after if late_after is not None else interval / 2)
+        self.start = None
+
+    def get_deadline(self, tick):
+        return self.start + tick * self.interval
+
+    # Get the first tick after tick whose deadline has not passed at now, the ones between them are missed
+    def get_next_tick(self, tick, now):
+        next_tick = max(tick + 1, math.ceil((now - self.start) / self.interval))
+        if next_tick - tick > 1:
+            self.stats.add_missed(next_tick - tick - 1)
+        return next_tick
+
+    # Yield (tick, deadline) at every deadline from now, sleeping until it
+    def ticks(self, start=None):
+        self.start = time.monotonic() if start is None else start
+        tick = 0
+        while True:
+            delay = self.get_deadline(tick) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield tick, self.get_deadline(tick)
+            tick = self.get_next_tick(tick, time.monotonic())
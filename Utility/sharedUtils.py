@@ -1,16 +1,73 @@
 import argparse
 import configparser
+import functools
+import importlib.util
+import multiprocessing
 import ntpath
 import os
 import sqlite3
-from datetime import datetime
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 
-import pandas as pd
+from Utility import aggregateCache, parquetStore
 
 
-# Set matplotlib backend from config file
-def set_matplotlib_backend(matplotlib, config_file):
-    matplotlib.use(get_single_value_from_config(config_file, 'SETTINGS', 'matplotlib_backend'))
+# Import a module the first time one of its attributes is used, so the scripts that only parse the arguments, or stop
+# on them, do not wait for the heavy ones. An "import name" done later loads it at once
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+pd = lazy_import('pandas')
+downsample = lazy_import('Utility.downsample')
+
+# Frequencies of the network rollup tables, from the finest
+ROLLUP_FREQS = ['1s', '1min']
+# Table of the rollups that have all the rows of their packets table, the others are not used
+ROLLUP_COVERAGE_TABLE = 'rollup_coverage'
+
+# Schema version, in PRAGMA user_version, of the tables with the indexed integer timestamps columns:
+# ts_ns (epoch nanoseconds) and tod_ns (nanoseconds from midnight UTC)
+INT_TIMESTAMPS_SCHEMA_VERSION = 2
+INT_TIMESTAMPS_COLUMNS = 'ts_ns INTEGER, tod_ns INTEGER'
+INT_TIMESTAMPS_COLUMN_NAMES = ('ts_ns', 'tod_ns')
+NS_PER_SECOND = 10 ** 9
+NS_PER_DAY = 86400 * NS_PER_SECOND
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Date of the data of all the days compared with --h24, the default of set_same_date
+SAME_DATE = '2020-01-01'
+
+# pandas aggregation of the grouped data -> SQLite aggregate function
+SQL_AGGREGATES = {'count': 'COUNT', 'sum': 'SUM', 'mean': 'AVG'}
+
+# Aggregate of the grouped data with the count and the sum columns, that can be grouped again by a coarser frequency
+COUNT_SUM = 'count_sum'
+
+# Rows read at a time when the data is grouped outside SQLite
+CHUNK_SIZE = 100000
+
+# Methods of downsample.get_indices
+DOWNSAMPLE_METHODS = ['minmax', 'lttb', 'none']
+
+# Fill policies of timeJoin.join
+JOIN_FILL_POLICIES = ['drop', 'zero', 'ffill']
+
+
+# Set matplotlib backend from config file, headless uses Agg that does not import any GUI toolkit
+def set_matplotlib_backend(matplotlib, config_file, headless=False):
+    matplotlib.use('Agg' if headless else get_single_value_from_config(config_file, 'SETTINGS', 'matplotlib_backend'))
 
 
 # Get the filename from a path
@@ -19,38 +76,33 @@ def get_file_name_from_path(file_path):
     return tail or ntpath.basename(head)
 
 
-# Move data in a dataset to start from midnight
-def data_start_from_midnight(data):
-    i = 0
-    flag = True
-    for j in range(len(data)):
-        if datetime.fromisoformat(data[j][0]).hour != 0 and not flag:
-            i += 1
-        else:
-            flag = False
-        data[j] = (set_same_date(data[j][0]), data[j][1])
-
-    _data = data[i:]
-    _data.extend(data[:i])
-
-    return _data
+# Move the data of a dataset to the same date and to start from midnight, the data is the rows from the DB or a
+# DataFrame and the first of the fields is the timestamp. Return a DataFrame with the timestamps parsed
+def data_start_from_midnight(data, fields):
+    df = set_same_date_data(data, fields=fields)
+    return df.sort_values(fields[0], kind='stable', ignore_index=True)
 
 
-# Set same date for a data
+# Set same date for a timestamp
 def set_same_date(timestamp, year=2020, month=1, day=1):
     return datetime.fromisoformat(timestamp).replace(year, month, day).isoformat()
 
 
-# Set same date for data
-def set_same_date_data(data, year=2020, month=1, day=1, ts_index=0):
-    _data = []
-    for row in data:
-        _r = row[:ts_index]
-        _r.append(set_same_date(row[ts_index], year, month, day))
-        _r.extend(row[ts_index + 1:])
-        _data.append(tuple(_r))
+# Set same date for a datetime64 Series keeping the time of the day and the time zone
+def set_same_date_series(timestamps, year=2020, month=1, day=1):
+    return timestamps - timestamps.dt.normalize() + pd.Timestamp(year, month, day, tz=timestamps.dt.tz)
 
-    return _data
+
+# Set same date for data, the rows from the DB or a DataFrame with the fields as columns.
+# Return a DataFrame with the timestamps, the ts_index field, parsed
+def set_same_date_data(data, year=2020, month=1, day=1, ts_index=0, fields=None):
+    if isinstance(data, pd.DataFrame):
+        df = data[fields].copy() if fields else data.copy()
+    else:
+        df = pd.DataFrame(data, columns=fields)
+    ts_field = df.columns[ts_index]
+    df[ts_field] = set_same_date_series(pd.to_datetime(df[ts_field], format='ISO8601'), year, month, day)
+    return df
 
 
 # Get time from a timestamp
@@ -58,33 +110,65 @@ def get_time_from_timestamp(timestamp):
     return datetime.fromisoformat(timestamp).time().isoformat()
 
 
-# Get file end from config file
-def get_file_end_from_config(config_file):
+# Get the UTC date and time of a timestamp formatted like SQLite datetime(), naive timestamps are UTC
+def get_sql_datetime_from_timestamp(timestamp):
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# Get the epoch nanoseconds and the nanoseconds from midnight of an ISO timestamp, naive timestamps are UTC
+def get_int_timestamps(timestamp):
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    ts_ns = (dt - _EPOCH) // timedelta(microseconds=1) * 1000
+    return ts_ns, ts_ns % NS_PER_DAY
+
+
+# Get the parsed config file, every file is read only once
+@functools.lru_cache(maxsize=None)
+def get_config(config_file):
     config = configparser.ConfigParser()
     config.read(config_file)
+    return config
+
+
+# Get file end from config file
+def get_file_end_from_config(config_file):
+    config = get_config(config_file)
     return config['COMMON']['file_end']
 
 
 # Get basic config variables from a file
 def get_chart_config_from_file(config_file, section):
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    config = get_config(config_file)
     section = config[section]
     return section['fields'].split(' '), section['table_name'], section['where_data']
 
 
 # Get the Influxdb basic config variables from a file
 def get_config_influxdb_from_file(config_file):
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    config = get_config(config_file)
     s_influxdb = config['INFLUXDB_V2']
     return s_influxdb['url'], s_influxdb['bucket'], config['POWER']['_measurement'], config['NETWORK']['_measurement']
 
 
+# Get the aggregate cache of the chart data from the config file, None with no_cache. A relative cache_dir is
+# relative to the directory of the config file
+def get_aggregate_cache_from_config(config_file, no_cache=False):
+    if no_cache:
+        return None
+    config = get_config(config_file)
+    s_cache = config['CACHE']
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(config_file)), os.path.expanduser(s_cache['cache_dir']))
+    return aggregateCache.AggregateCache(cache_dir, int(float(s_cache['max_size_mb']) * 1024 * 1024))
+
+
 # Get single value from config file
 def get_single_value_from_config(config_file, section, key, t=None):
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    config = get_config(config_file)
     value = config[section][key] if t is None else t(config[section][key])
     return value
 
@@ -96,6 +180,24 @@ def parser_add_db_args(parser, table_name=''):
                         help=f'Drop the table {table_name} if exists and create it again before writing data')
 
 
+# Add arguments to tune the SQLite bulk writes to a parser
+def parser_add_sql_write_args(parser, default_batch_size=10000):
+    parser.add_argument('--batch_size', type=int, default=default_batch_size,
+                        help=f'Number of rows written in one transaction. Default: {default_batch_size}')
+    parser.add_argument('--journal_mode', type=str.upper,
+                        choices=['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'],
+                        help='SQLite journal_mode pragma for the load. Default: SQLite default')
+    parser.add_argument('--synchronous', type=str.upper, choices=['OFF', 'NORMAL', 'FULL', 'EXTRA'],
+                        help='SQLite synchronous pragma for the load. Default: SQLite default')
+
+
+# Add the argument to create the tables with the integer timestamps schema to a parser
+def parser_add_int_timestamps_args(parser):
+    parser.add_argument('--int_timestamps', action='store_true',
+                        help=f'Also store the timestamps as indexed integer epoch and time of day nanoseconds (schema '
+                             f'version {INT_TIMESTAMPS_SCHEMA_VERSION}). Existing tables are migrated')
+
+
 # Add basic arguments to manage db_dir to a parser
 def parser_add_db_dir_args(parser, file_end):
     db_grp = parser.add_mutually_exclusive_group(required=True)
@@ -118,6 +220,12 @@ def parser_add_matplotlib_args(parser, default_line_style='None', default_color=
     parser.add_argument('--color', help='Choose a custom color', default=default_color)
     parser.add_argument('--no_grid', help='Do not show the grid', action='store_true')
     parser.add_argument('--no_legend', help='Do not show the legend', action='store_true')
+    parser.add_argument('--downsample', choices=DOWNSAMPLE_METHODS, default='minmax',
+                        help='How to choose the points drawn of a series with more than --max_points points: minmax '
+                             'keeps the minimum and the maximum of every group of points, lttb the most visible '
+                             'ones. Scatter plots keep one point for every cell of a grid. Default: minmax')
+    parser.add_argument('--max_points', type=int, default=5000,
+                        help='Number of points drawn of a series, 0 to draw all of them. Default: 5000')
 
 
 # Add basic arguments to manage time and h24
@@ -128,20 +236,57 @@ def parser_add_time_args(parser):
 
 
 # Get basic default parser
-def get_basic_parser(desc, file_end, default_color=None):
+def get_basic_parser(desc, file_end, default_color=None, multiple_grp_freq=False):
     parser = argparse.ArgumentParser(description=desc)
     parser_add_db_dir_args(parser, file_end)
     parser_add_sql_args(parser)
     parser_add_matplotlib_args(parser, default_color=default_color)
     parser_add_time_args(parser)
-    parser_add_pandas_args(parser)
+    parser_add_pandas_args(parser, multiple_grp_freq)
+    parser_add_workers_args(parser)
+    parser_add_cache_args(parser)
+    parser_add_output_args(parser)
 
     return parser
 
 
-# Add basic arguments to manage the pandas
-def parser_add_pandas_args(parser):
-    parser.add_argument('--grp_freq', help='Frequency to group data', default='1s')
+# Add basic arguments to manage the pandas, with multiple --grp_freq is a list of frequencies
+def parser_add_pandas_args(parser, multiple=False):
+    if multiple:
+        parser.add_argument('--grp_freq', nargs='+', default=['1s'],
+                            help='Frequencies to group data, every one is computed from the data read once. '
+                                 'Default: 1s')
+    else:
+        parser.add_argument('--grp_freq', help='Frequency to group data', default='1s')
+
+
+# Add the argument to load the DBs in parallel to a parser
+def parser_add_workers_args(parser):
+    default_workers = min(4, os.cpu_count() or 1)
+    parser.add_argument('--workers', type=int, default=default_workers,
+                        help=f'Number of processes loading and grouping the DBs in parallel, 1 to load them one after '
+                             f'the other. Default: {default_workers}')
+
+
+# Add the argument to not query again the data of the zoomed window to a parser
+def parser_add_requery_args(parser):
+    parser.add_argument('--no_requery', action='store_true',
+                        help='With --time or --h24, do not query again the visible window with a finer --grp_freq '
+                             'when zooming')
+
+
+# Add the arguments to save the plots to files instead of showing them to a parser
+def parser_add_output_args(parser):
+    parser.add_argument('--output', metavar='DIR',
+                        help='Save the plots in this directory without opening a window: one for every DB, or one '
+                             'of all of them with --h24. The plots are made in --workers processes')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png', help='Format of the --output files')
+
+
+# Add the argument to skip the aggregate cache to a parser
+def parser_add_cache_args(parser):
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Do not read nor write the cache of the aggregated data, query the DBs again')
 
 
 # Check ends with proper file end
@@ -170,53 +315,423 @@ def check_db_files_exist(db_paths):
 # Validate args
 def validate_args(args):
     len_dbs = len(args.db)
-    if len_dbs > 1 and args.time:
-        raise argparse.ArgumentTypeError('Cannot use --time with more than one DB file, use --h24 instead')
+    if len_dbs > 1 and args.time and not args.output:
+        raise argparse.ArgumentTypeError('Cannot use --time with more than one DB file, use --h24 or --output instead')
 
     if args.h24 and len_dbs < 2:
         raise argparse.ArgumentTypeError('Cannot use --h24 with less than two DB files')
 
+    if args.workers < 1:
+        raise argparse.ArgumentTypeError('--workers must be at least 1')
+
+
+# Get the (start, end) epoch nanoseconds of a time range comparing whole seconds, the end second is included.
+# With h24 they are the nanoseconds from midnight, None is no limit
+def get_int_timestamps_range(start=None, end=None, h24=False):
+    def get_ns(timestamp, is_end=False):
+        if not timestamp:
+            return None
+        ns = get_int_timestamps(timestamp)[1 if h24 else 0] // NS_PER_SECOND * NS_PER_SECOND
+        return ns + NS_PER_SECOND - 1 if is_end else ns
+
+    return get_ns(start), get_ns(end, True)
+
 
 # Choose the right SQL query to execute
 # "where data" should be a string with the SQL data of conditions
-def choose_sql_query(fields, table, start=None, end=None, where_data=None, h24=False):
-    if h24 and (start or end):
+# With int_timestamps the conditions and the order use the indexed ts_ns and tod_ns columns, order_by replaces the
+# default order, by timestamp or by group_by
+def choose_sql_query(fields, table, start=None, end=None, where_data=None, h24=False, group_by=None,
+                     int_timestamps=False, select=None, order_by=None):
+    if int_timestamps:
+        fields_0 = 'tod_ns' if h24 else 'ts_ns'
+
+        # Compare whole seconds like time() does, the end second is included
+        def get_arg(timestamp, end=False):
+            start_ns, end_ns = get_int_timestamps_range(timestamp, timestamp, h24)
+            return end_ns if end else start_ns
+    elif h24:
         fields_0 = f'time({fields[0]})'
+
+        def get_arg(timestamp, _end=False):
+            return get_time_from_timestamp(timestamp)
     else:
-        fields_0 = fields[0]
+        # Compare whole seconds in UTC like the integer timestamps, naive timestamps are UTC
+        fields_0 = f'datetime({fields[0]})'
+
+        def get_arg(timestamp, _end=False):
+            return get_sql_datetime_from_timestamp(timestamp)
 
-    sql_base = f'SELECT {",".join(fields)} FROM {table}'
-    order_by = f'ORDER BY {fields[0]}'
+    sql_base = f'SELECT {",".join(select or fields)} FROM {table}'
+    order_by = f'ORDER BY {order_by or group_by or ("ts_ns" if int_timestamps else fields[0])}'
+    if group_by:
+        order_by = f'GROUP BY {group_by} {order_by}'
     where_data = 'true' if not where_data else f' {where_data}'
     if start and end:
-        start = get_time_from_timestamp(start)
-        end = get_time_from_timestamp(end)
+        start = get_arg(start)
+        end = get_arg(end, True)
         return f'{sql_base} WHERE {where_data} AND {fields_0} BETWEEN ? AND ? {order_by}', (start, end)
     if start:
-        start = get_time_from_timestamp(start)
+        start = get_arg(start)
         return f'{sql_base} WHERE {where_data} AND {fields_0} >= ? {order_by}', (start,)
     if end:
-        end = get_time_from_timestamp(end)
+        end = get_arg(end, True)
         return f'{sql_base} WHERE {where_data} AND {fields_0} <= ? {order_by}', (end,)
     return f'{sql_base} WHERE {where_data} {order_by}', ()
 
 
-# Get data from a db
+# Check if the Parquet dataset of a table can answer a query, it has to have all the rows of the table. The rows
+# cannot be ordered by the time of the day, with h24 and same_date
+def can_read_dataset(db_path, table, where_data=None, h24=False, same_date=False):
+    if where_data or h24 and same_date or not parquetStore.has_dataset(db_path, table):
+        return False
+    with sqlite3.connect(db_path) as conn:
+        return parquetStore.is_dataset_complete(conn, table)
+
+
+# Get the (ts_range, tod_range) of the Parquet dataset for the start and the end of a query, they are times of the day
+# with h24
+def get_dataset_ranges(start=None, end=None, h24=False):
+    ranges = get_int_timestamps_range(start, end, h24)
+    return ((None, None), ranges) if h24 else (ranges, (None, None))
+
+
+# Get the rows of data from a db as a list of tuples, from the Parquet dataset of the table if there is one that can
+# answer the query. Its timestamps are turned back into ISO strings, so the rows are the same of the SQLite table
 def get_data_from_db(db_path, fields, table, start=None, end=None, where_data=None, h24=False):
+    if can_read_dataset(db_path, table, where_data, h24):
+        df = parquetStore.read_dataset(parquetStore.get_dataset_path(db_path, table), fields,
+                                       *get_dataset_ranges(start, end, h24))
+        df[fields[0]] = df[fields[0]].map(pd.Timestamp.isoformat)
+        return list(df.itertuples(index=False, name=None))
+
     with sqlite3.connect(db_path) as conn:
-        sql_query, sql_args = choose_sql_query(fields, table, start, end, where_data, h24)
+        sql_query, sql_args = choose_sql_query(fields, table, start, end, where_data, h24,
+                                               int_timestamps=has_int_timestamps(db_path, table, conn))
         return conn.execute(sql_query, sql_args).fetchall()
 
 
-# Get data frame from data
-def get_data_frame_from_data(data, fields, grp_freq='1s'):
-    df = pd.DataFrame(data, columns=fields)
-    df[fields[0]] = pd.to_datetime(df[fields[0]])
-    df = df.groupby(pd.Grouper(key=fields[0], freq=grp_freq))
+# Yield the rows of an executed cursor in lists of at most chunk_size rows
+def fetch_chunks(cursor, chunk_size=CHUNK_SIZE):
+    rows = cursor.fetchmany(chunk_size)
+    while rows:
+        yield rows
+        rows = cursor.fetchmany(chunk_size)
+
+
+# Yield the rows of a db in chunks of at most chunk_size rows, the cursor fetches one chunk at a time so the rows are
+# never all in memory. From the Parquet dataset of the table, if it can answer the query, the chunks are DataFrames with
+# the timestamps already parsed. With h24 and same_date the rows are ordered by the time of the day
+def get_data_chunks_from_db(db_path, fields, table, start=None, end=None, where_data=None, h24=False, same_date=False,
+                            chunk_size=CHUNK_SIZE):
+    if can_read_dataset(db_path, table, where_data, h24, same_date):
+        yield from parquetStore.iter_dataset(parquetStore.get_dataset_path(db_path, table), fields,
+                                             *get_dataset_ranges(start, end, h24), batch_size=chunk_size)
+        return
+
+    with sqlite3.connect(db_path) as conn:
+        int_timestamps = has_int_timestamps(db_path, table, conn)
+        order_by = None
+        if h24 and same_date:
+            order_by = 'tod_ns' if int_timestamps else f'substr({fields[0]}, 12)'
+        sql_query, sql_args = choose_sql_query(fields, table, start, end, where_data, h24,
+                                               int_timestamps=int_timestamps, order_by=order_by)
+        yield from fetch_chunks(conn.execute(sql_query, sql_args), chunk_size)
+
+
+# Group chunks of data by grp_freq with the aggregate (count, sum, mean or count_sum) of the value, like
+# get_data_frame_from_data(...).<aggregate>().reset_index() of all the data, keeping only the count and the sum of
+# every bucket. The chunks are rows from the DB or DataFrames ordered by timestamp, so only the last bucket of a chunk
+# can continue in the next one and it is merged with it, with same_date the data is moved to the same date like
+# data_start_from_midnight does. Return (DataFrame, first timestamp, last timestamp) or None if there is no data
+def get_grouped_data_from_chunks(chunks, fields, grp_freq, aggregate, same_date=False):
+    # The fixed frequencies start from the midnight of the first day like pandas does with all the data, the others
+    # from the calendar
+    try:
+        pd.Timedelta(grp_freq)
+        origin = None
+    except ValueError:
+        origin = 'start_day'
+    buckets = []
+    last_bucket = None
+    first = last = None
+    for chunk in chunks:
+        data = chunk if not same_date else data_start_from_midnight(chunk, fields)
+        df = data[fields].copy() if isinstance(data, pd.DataFrame) else pd.DataFrame(data, columns=fields)
+        df[fields[0]] = timestamps = pd.to_datetime(df[fields[0]], format='ISO8601')
+
+        i_first, i_last = timestamps.argmin(), timestamps.argmax()
+        if first is None or timestamps.iloc[i_first] < first[0]:
+            first = timestamps.iloc[i_first], get_data_timestamp(data, i_first)
+        if last is None or timestamps.iloc[i_last] >= last[0]:
+            last = timestamps.iloc[i_last], get_data_timestamp(data, i_last)
+        if origin is None:
+            origin = first[0].normalize()
+
+        partial = get_data_frame_from_data(df, fields, grp_freq, origin)[fields[1]].agg(['count', 'sum'])
+        if last_bucket is not None:
+            partial = pd.concat([last_bucket, partial]).groupby(level=0).sum()
+        buckets.append(partial.iloc[:-1])
+        last_bucket = partial.iloc[-1:]
+    if last_bucket is None:
+        return None
+
+    df = pd.concat(buckets + [last_bucket])
+    # The chunks were not ordered, like the batches of a Parquet dataset written by more ingests
+    if not df.index.is_unique or not df.index.is_monotonic_increasing:
+        df = df.groupby(level=0).sum()
+    # Add the empty buckets between the chunks
+    df = df.reindex(pd.date_range(df.index[0], df.index[-1], freq=grp_freq, name=fields[0]), fill_value=0)
+    if aggregate == COUNT_SUM:
+        return df.reset_index(), first[1], last[1]
+    values = df['sum'] / df['count'] if aggregate == 'mean' else df[aggregate]
+
+    return values.rename(fields[1]).reset_index(), first[1], last[1]
+
+
+# Get the SQL expression of the number of the grp_freq bucket of a row, None if SQLite cannot compute it.
+# The buckets start from the epoch, so grp_freq has to divide a day for them to start from midnight like pandas does.
+# Without the integer timestamps it needs a grp_freq of whole seconds, the ISO timestamps are cut to the seconds because
+# SQLite rounds the fraction to the milliseconds and the buckets are of the wall time like pandas does
+def get_sql_bucket(grp_freq, ts_field, h24=False, int_timestamps=False):
+    try:
+        bucket_ns = pd.Timedelta(grp_freq).value
+    except ValueError:
+        return None
+    if bucket_ns <= 0 or NS_PER_DAY % bucket_ns:
+        return None
+    if int_timestamps:
+        return f'{"tod_ns" if h24 else "ts_ns"} / {bucket_ns}'
+    if bucket_ns % NS_PER_SECOND:
+        return None
+    seconds = f"CAST(strftime('%s', substr({ts_field}, 1, 19)) AS INTEGER)"
+    return f"{seconds}{' % 86400' if h24 else ''} / {bucket_ns // NS_PER_SECOND}"
+
+
+# Get the data of a db grouped by grp_freq inside SQLite, only one row for every bucket is read.
+# Return the same DataFrame of get_data_frame_from_data(...).<aggregate>().reset_index() and the first and last
+# timestamps, None if SQLite cannot group by grp_freq. With h24 and same_date the data of all the days is moved to the
+# same date like data_start_from_midnight does, otherwise h24 only selects the time of the day between start and end
+def get_aggregated_data_from_db(db_path, fields, table, grp_freq, aggregate, start=None, end=None, where_data=None,
+                                h24=False, same_date=True):
+    same_date = h24 and same_date
+    with sqlite3.connect(db_path) as conn:
+        int_timestamps = has_int_timestamps(db_path, table, conn)
+        bucket = get_sql_bucket(grp_freq, fields[0], same_date, int_timestamps)
+        if bucket is None:
+            return None
+        # The first and last timestamps of a bucket, with same_date only the time of the day that follows the date
+        ts_field = f'substr({fields[0]}, 12)' if same_date else fields[0]
+        aggregates = ['count', 'sum'] if aggregate == COUNT_SUM else [aggregate]
+        select = [f'{bucket} AS bucket', f'MIN({ts_field})', f'MAX({ts_field})'] + \
+                 [f'{SQL_AGGREGATES[a]}({fields[1]})' for a in aggregates]
+        sql_query, sql_args = choose_sql_query(fields, table, start, end, where_data, h24, 'bucket', int_timestamps,
+                                               select)
+        rows = conn.execute(sql_query, sql_args).fetchall()
+    value_columns = aggregates if aggregate == COUNT_SUM else fields[1:]
+    if not rows:
+        return pd.DataFrame(columns=fields[:1] + value_columns), None, None
+
+    _, first_timestamps, _, *values = zip(*rows)
+    first, last = rows[0][1], rows[-1][2]
+    if same_date:
+        first_timestamps = [f'{SAME_DATE}T{t}' for t in first_timestamps]
+        first, last = f'{SAME_DATE}T{first}', f'{SAME_DATE}T{last}'
+    timestamps = pd.to_datetime(pd.Series(first_timestamps), format='ISO8601').dt.floor(grp_freq)
+
+    # Add the empty buckets like pandas does
+    df = pd.DataFrame(dict(zip(value_columns, values)), index=pd.DatetimeIndex(timestamps, name=fields[0]))
+    df = df.reindex(pd.date_range(timestamps.iloc[0], timestamps.iloc[-1], freq=grp_freq, name=fields[0]),
+                    fill_value=float('nan') if aggregate == 'mean' else 0)
+    if aggregate != 'mean':
+        df[value_columns] = df[value_columns].fillna(0)
+
+    return df.reset_index(), first, last
+
+
+# Get the data of a db grouped by grp_freq with the aggregate (count, sum or mean) of the value, inside SQLite if
+# possible, otherwise reading chunk_size rows at a time. With the aggregate count_sum the DataFrame has the count and
+# the sum columns instead of the value. Return (DataFrame, first timestamp, last timestamp) or None if there is no data
+def get_grouped_data_from_db(db_path, fields, table, grp_freq, aggregate, start=None, end=None, where_data=None,
+                             h24=False, same_date=True, chunk_size=CHUNK_SIZE):
+    if not can_read_dataset(db_path, table, where_data, h24, same_date):
+        grouped = get_aggregated_data_from_db(db_path, fields, table, grp_freq, aggregate, start, end, where_data,
+                                              h24, same_date)
+        if grouped is not None:
+            return grouped if len(grouped[0]) else None
+
+    chunks = get_data_chunks_from_db(db_path, fields, table, start, end, where_data, h24, same_date, chunk_size)
+    return get_grouped_data_from_chunks(chunks, fields, grp_freq, aggregate, h24 and same_date)
+
+
+# Get the name of a rollup table of a network table, the rollups are written by ipPacketsToStatsSQL.py
+def get_rollup_table_name(table, freq):
+    return f'{table}_rollup_{freq}'
+
+
+# Check if a rollup table has all the rows of its packets table, the ingest adds it to the coverage table once it is
+# filled from the rows loaded before it existed
+def is_rollup_complete(conn, rollup_table):
+    try:
+        return conn.execute(f'SELECT 1 FROM {ROLLUP_COVERAGE_TABLE} WHERE rollup = ?',
+                            (rollup_table,)).fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+
+# Get the rollup table to use to group the data of a table by grp_freq, None if the raw rows have to be grouped.
+# A rollup can be used if grp_freq is a multiple of its frequency, it is complete and there are no custom conditions
+def get_rollup_table(db_path, table, grp_freq, where_data=None):
+    if where_data:
+        return None
+    try:
+        grp_delta = pd.Timedelta(grp_freq)
+    except ValueError:
+        return None
+
+    with sqlite3.connect(db_path) as conn:
+        for freq in ROLLUP_FREQS[::-1]:
+            rollup_table = get_rollup_table_name(table, freq)
+            if grp_delta >= pd.Timedelta(freq) and grp_delta % pd.Timedelta(freq) == pd.Timedelta(0) and \
+                    is_rollup_complete(conn, rollup_table):
+                return rollup_table
+    return None
+
+
+# Yield the (bucket, value) rows from a rollup table in chunks of at most chunk_size rows, value is "packets" or
+# "bytes" summed for each bucket. With h24 and same_date the rows are ordered by the time of the day
+def get_data_chunks_from_rollup(db_path, rollup_table, value, start=None, end=None, h24=False, same_date=False,
+                                chunk_size=CHUNK_SIZE):
+    with sqlite3.connect(db_path) as conn:
+        sql_query, sql_args = choose_sql_query(['bucket', f'SUM({value})'], rollup_table, start, end, h24=h24,
+                                               group_by='bucket',
+                                               order_by='substr(bucket, 12)' if h24 and same_date else None)
+        yield from fetch_chunks(conn.execute(sql_query, sql_args), chunk_size)
+
+
+# Get the packets count, or the bytes sum with sum_bytes, of a network table grouped by grp_freq. It is read from a
+# rollup table written by the ingest if possible, otherwise it is grouped like get_grouped_data_from_db.
+# Return (DataFrame, first timestamp, last timestamp) or None if there is no data
+def get_grouped_packets_from_db(db_path, fields, table, grp_freq, sum_bytes=False, start=None, end=None,
+                                where_data=None, h24=False, same_date=True, chunk_size=CHUNK_SIZE):
+    rollup_table = get_rollup_table(db_path, table, grp_freq, where_data)
+    if not rollup_table:
+        return get_grouped_data_from_db(db_path, fields, table, grp_freq, 'sum' if sum_bytes else 'count', start, end,
+                                        where_data, h24, same_date, chunk_size)
+
+    chunks = get_data_chunks_from_rollup(db_path, rollup_table, 'bytes' if sum_bytes else 'packets', start, end, h24,
+                                         same_date, chunk_size)
+    return get_grouped_data_from_chunks(chunks, fields, grp_freq, 'sum', h24 and same_date)
+
+
+# Yield function(item) of every item, in order, computed in a pool of at most workers processes. The processes are
+# forked so the chart scripts are not run again in them, without fork the items are computed one at a time
+def map_in_pool(function, items, workers=1):
+    workers = min(workers, len(items))
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        yield from map(function, items)
+        return
+
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        yield from pool.imap(function, items)
+
+
+# Run a job (function, db path, keyword arguments) of load_from_dbs, return the result and the seconds it took
+def _load_from_db(job):
+    function, db_path, kwargs = job
+    start_time = time.perf_counter()
+    result = function(db_path, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+# Get the name of a job of load_from_dbs to print
+def _get_job_name(function, db_path, kwargs):
+    return f'{kwargs.get("table", function.__name__)} of {db_path}'
+
+
+# Get the versions of the libraries of the values in an aggregate cache
+@functools.lru_cache(maxsize=None)
+def get_cache_library_versions():
+    from importlib import metadata
+
+    return tuple(metadata.version(name) for name in ('pandas', 'numpy'))
+
+
+# Get the key of the result of a job of load_from_dbs in an aggregate cache, it changes when the DB, its WAL file or
+# the Parquet dataset of the table are written, when the code of the function or of the loaders changes and with other
+# versions of pandas or numpy
+def get_job_cache_key(cache, function, db_path, kwargs):
+    sources = [db_path, f'{db_path}-wal', sys.modules[function.__module__].__file__, __file__, parquetStore.__file__]
+    if 'table' in kwargs:
+        sources.append(parquetStore.get_dataset_path(db_path, kwargs['table']))
+    return cache.get_key(sources, f'{function.__module__}.{function.__name__}', sorted(kwargs.items()),
+                         get_cache_library_versions())
+
+
+# Run the jobs (function, db path, keyword arguments) in a pool of at most workers processes with map_in_pool and
+# return their results in the same order, printing the time of each job. The functions must be importable, e.g. the
+# ones of this module. With an aggregate cache the results of the jobs already run on the same data are read from it
+def load_from_dbs(jobs, workers=1, cache=None):
+    loaded = [aggregateCache.MISS] * len(jobs)
+    keys = [None] * len(jobs)
+    if cache is not None:
+        for i, (function, db_path, kwargs) in enumerate(jobs):
+            start_time = time.perf_counter()
+            keys[i] = get_job_cache_key(cache, function, db_path, kwargs)
+            loaded[i] = cache.get(keys[i])
+            if loaded[i] is not aggregateCache.MISS:
+                print(f'Loaded {_get_job_name(function, db_path, kwargs)} from the cache in '
+                      f'{time.perf_counter() - start_time:.2f}s')
+
+    missing = [i for i, result in enumerate(loaded) if result is aggregateCache.MISS]
+    for i, (result, seconds) in zip(missing, map_in_pool(_load_from_db, [jobs[i] for i in missing], workers)):
+        print(f'Loaded {_get_job_name(*jobs[i])} in {seconds:.2f}s')
+        loaded[i] = result
+        if cache is not None:
+            cache.put(keys[i], result)
+
+    return loaded
+
+
+# Run a job (function, db path, keyword arguments) for every DB with load_from_dbs and create the datasets of the plots
+# from the results (DataFrame, first timestamp, last timestamp) and their jobs, the DBs without data are skipped
+def get_datasets_from_dbs(jobs, workers=1, cache=None):
+    datasets = []
+    for job, grouped in zip(jobs, load_from_dbs(jobs, workers, cache)):
+        db_path = job[1]
+        if grouped:
+            df, first_timestamp, last_timestamp = grouped
+            datasets.append({
+                'label': get_file_name_from_path(db_path),
+                'df': df,
+                'first_timestamp': first_timestamp,
+                'last_timestamp': last_timestamp,
+                'db_path': db_path,
+                'job': job
+            })
+        else:
+            print(f'No data found in {db_path}')
+
+    return datasets
+
+
+# Get data frame from data, the rows from the DB or a DataFrame read from a Parquet dataset, grouped by grp_freq with
+# the buckets starting from origin, the midnight of the first day by default
+def get_data_frame_from_data(data, fields, grp_freq='1s', origin='start_day'):
+    df = data[fields] if isinstance(data, pd.DataFrame) else pd.DataFrame(data, columns=fields)
+    df[fields[0]] = pd.to_datetime(df[fields[0]], format='ISO8601')
+    df = df.groupby(pd.Grouper(key=fields[0], freq=grp_freq, origin=origin))
 
     return df
 
 
+# Get the first (index 0) or last (index -1) timestamp of the data from the DB as a string
+def get_data_timestamp(data, index=0):
+    if isinstance(data, pd.DataFrame):
+        return data.iloc[index, 0].isoformat()
+    return data[index][0]
+
+
 # Create title for one db plot
 def get_plot_title_one_db_from_dataset(dataset):
     return f'{dataset["label"]} [{dataset["first_timestamp"]} - {dataset["last_timestamp"]}]'
@@ -244,44 +759,58 @@ def set_fig_ax(fig, ax, title, x_label, y_label, w_title, legend=False, no_grid=
         fig_manager.set_window_title(w_title)
 
 
-# Plot data from dataset
+# Plot data from dataset, with more than max_points points only the ones chosen by the downsample method are drawn.
+# Return the line, or the points of a scatter plot, and the fill, None with no_fill
 def plot_data_from_dataset(dataset, plot_f, fields, ax, time=False, no_fill=False, line_style='-', color=None,
-                           marker=None, keep_xdata=False):
+                           marker=None, keep_xdata=False, downsample_method='minmax', max_points=5000, scatter=False):
     plot_data = [None, dataset['df'][fields[1]]]
     if keep_xdata:
         plot_data[0] = dataset['df'][fields[0]]
     elif time:
         plot_data[0] = dataset['df'][fields[0]]
     else:
-        plot_data[0] = range(1, len(plot_data[1]) + 1)
+        plot_data[0] = pd.RangeIndex(1, len(plot_data[1]) + 1)
 
-    plot_f(*plot_data, label=dataset['label'], linestyle=line_style, color=color, marker=marker)
+    indices = downsample.get_indices(plot_data[0], plot_data[1], max_points, downsample_method, scatter)
+    if len(indices) < len(plot_data[1]):
+        plot_data = [data[indices] if isinstance(data, pd.RangeIndex) else data.iloc[indices] for data in plot_data]
+
+    artist = plot_f(*plot_data, label=dataset['label'], linestyle=line_style, color=color, marker=marker)
+    fill = None
     if not no_fill:
         if color:
-            ax.fill_between(*plot_data, color=color, alpha=0.3)
+            fill = ax.fill_between(*plot_data, color=color, alpha=0.3)
         else:
-            ax.fill_between(*plot_data, alpha=0.3)
+            fill = ax.fill_between(*plot_data, alpha=0.3)
+
+    return artist[0] if isinstance(artist, list) else artist, fill
 
 
-# Plot data from datasets
+# Plot data from datasets, return the figure, the axes and the artists of each dataset of plot_data_from_dataset
 def plot_data_from_datasets(plt, plot_f, w_title, datasets, fields, y_label, x_label=None, no_fill=False,
                             line_style='None', color=None, marker=None, no_grid=False, legend=True, time=False,
                             h24=False,
-                            date_format=None, grp_freq='1s', keep_xdata=False):
+                            date_format=None, grp_freq='1s', keep_xdata=False, downsample_method='minmax',
+                            max_points=5000, maximize=True):
     datasets_len = len(datasets)
 
     # Plot the datasets
     fig, ax = plt.subplots()
+    scatter = plot_f == 'scatter'
     plot_f = getattr(ax, plot_f)
     if datasets_len == 1:
         title = get_plot_title_one_db_from_dataset(datasets[0])
-        plot_data_from_dataset(datasets[0], plot_f, fields, ax, time, no_fill, line_style,
-                               color, marker, keep_xdata=keep_xdata)
+        artists = [plot_data_from_dataset(datasets[0], plot_f, fields, ax, time, no_fill, line_style,
+                                          color, marker, keep_xdata=keep_xdata, downsample_method=downsample_method,
+                                          max_points=max_points, scatter=scatter)]
     else:
         title = None
+        artists = []
         for dataset in datasets:
-            plot_data_from_dataset(dataset, plot_f, fields, ax, h24, no_fill, line_style,
-                                   marker=marker, keep_xdata=keep_xdata)
+            artists.append(plot_data_from_dataset(dataset, plot_f, fields, ax, h24, no_fill, line_style,
+                                                  marker=marker, keep_xdata=keep_xdata,
+                                                  downsample_method=downsample_method, max_points=max_points,
+                                                  scatter=scatter))
 
     # Set options
     if not x_label:
@@ -290,23 +819,37 @@ def plot_data_from_datasets(plt, plot_f, w_title, datasets, fields, y_label, x_l
             x_label = 'Time (HH:MM:SS)'
         else:
             x_label = f'Scale time (1:{grp_freq})'
-    set_fig_ax(fig, ax, title, x_label, y_label, w_title, legend, no_grid, True, plt, time or h24)
+    set_fig_ax(fig, ax, title, x_label, y_label, w_title, legend, no_grid, maximize, plt, time or h24)
 
+    return fig, ax, artists
 
-# Calculate the correlation between two fields in a merged data frame
-def get_correlation_dataframe(df_merge, field0, field1):
-    n = len(df_merge)
-    field0_mean = df_merge[field0].mean()
-    field1_mean = df_merge[field1].mean()
-    s_field0 = df_merge[field0].std()
-    s_field1 = df_merge[field1].std()
 
-    r = 0
-    for i in range(n):
-        r += (df_merge[field0][i] - field0_mean) * (df_merge[field1][i] - field1_mean)
-    r = r / ((n - 1) * s_field0 * s_field1)
+# Plot datasets with plot_data_from_datasets and save the figure to a file, in a worker of save_plots_from_datasets.
+# Return the path and the seconds it took
+def _save_plot(job):
+    path, datasets, plot_kwargs = job
+    import matplotlib.pyplot as plt
 
-    return f'{r:.3f}'
+    start_time = time.perf_counter()
+    fig, _, _ = plot_data_from_datasets(plt, datasets=datasets, maximize=False, **plot_kwargs)
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+    return path, time.perf_counter() - start_time
+
+
+# Save the plots of the datasets to files of format (png or svg) in output_dir instead of showing them: one for every
+# dataset named {name}_{DB name}, or one of all of them named {name} with compare. The plots are made by
+# plot_data_from_datasets with plot_kwargs in a pool of at most workers processes, the backend must not be interactive
+def save_plots_from_datasets(output_dir, name, fmt, datasets, compare=False, workers=1, **plot_kwargs):
+    os.makedirs(output_dir, exist_ok=True)
+    if compare:
+        jobs = [(os.path.join(output_dir, f'{name}.{fmt}'), datasets, plot_kwargs)]
+    else:
+        jobs = [(os.path.join(output_dir, f'{name}_{os.path.splitext(get_file_name_from_path(dataset["db_path"]))[0]}'
+                                          f'.{fmt}'), [dataset], plot_kwargs) for dataset in datasets]
+
+    for path, seconds in map_in_pool(_save_plot, jobs, workers):
+        print(f'Saved {path} in {seconds:.2f}s')
 
 
 # Get columns object from a db (index, name, type, notnull, default_value, primary_key)
@@ -332,3 +875,28 @@ def get_column_index(columns, column_name):
         if column[1] == column_name:
             return i
     return -1
+
+
+# Check if a table has the integer timestamps columns
+def has_int_timestamps(db_path, table_name, conn=None):
+    return any(column[1] == INT_TIMESTAMPS_COLUMN_NAMES[0]
+               for column in get_db_table_columns_obj(db_path, table_name, conn))
+
+
+# Create the indexes of the integer timestamps columns of a table
+def create_int_timestamps_indexes(conn, table_name):
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {table_name}_ts_ns ON {table_name} (ts_ns)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {table_name}_tod_ns ON {table_name} (tod_ns)')
+    conn.execute(f'PRAGMA user_version = {INT_TIMESTAMPS_SCHEMA_VERSION}')
+    conn.commit()
+
+
+# Add the integer timestamps columns to a table, filling them from its timestamp column
+def add_int_timestamps(conn, table_name, ts_field='timestamp'):
+    conn.create_function('epoch_ns', 1, lambda ts: get_int_timestamps(ts)[0] if ts else None, deterministic=True)
+    with conn:
+        conn.execute(f'ALTER TABLE {table_name} ADD COLUMN ts_ns INTEGER')
+        conn.execute(f'ALTER TABLE {table_name} ADD COLUMN tod_ns INTEGER')
+        conn.execute(f'UPDATE {table_name} SET ts_ns = epoch_ns({ts_field})')
+        conn.execute(f'UPDATE {table_name} SET tod_ns = ts_ns % {NS_PER_DAY}')
+    create_int_timestamps_indexes(conn, table_name)
@@ -0,0 +1,59 @@
+import time
+
+
+# Set the pragmas used for bulk loads, None keeps the SQLite default
+def set_bulk_pragmas(conn, journal_mode=None, synchronous=None):
+    if journal_mode:
+        conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+    if synchronous:
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+
+
+# Collect rows and write them with executemany, one transaction for each batch.
+# A batch is also written when its first row is older than max_delay seconds.
+# on_flush(conn) is called in the same transaction of the batch, e.g. to save a checkpoint
+class BufferedWriter:
+    def __init__(self, conn, sql_query, batch_size=10000, on_flush=None, max_delay=None):
+        self.conn = conn
+        self.sql_query = sql_query
+        self.batch_size = max(1, batch_size)
+        self.on_flush = on_flush
+        self.max_delay = max_delay
+        self.rows = []
+        self._first_row_time = 0.0
+        self.written = 0
+        self._start_time = time.perf_counter()
+
+    def add(self, row):
+        if not self.rows and self.max_delay is not None:
+            self._first_row_time = time.monotonic()
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size or (
+                self.max_delay is not None and time.monotonic() - self._first_row_time >= self.max_delay):
+            self.flush()
+
+    def flush(self):
+        if self.rows or self.on_flush:
+            with self.conn:
+                if self.rows:
+                    self.conn.executemany(self.sql_query, self.rows)
+                if self.on_flush:
+                    self.on_flush(self.conn)
+            self.written += len(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def elapsed(self):
+        return time.perf_counter() - self._start_time
+
+    def rows_per_second(self):
+        elapsed = self.elapsed()
+        return self.written / elapsed if elapsed > 0 else 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,61 @@
+import os
+import sys
+
+_path_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(_path_parent)
+
+import argparse
+import statistics
+import subprocess
+import time
+
+# Scripts run by the batch jobs, relative to the project directory
+DEFAULT_SCRIPTS = [
+    'PowerMeasure/powerChartsLineFromSQL.py',
+    'NetworkMeasure/packetsChartsLineFromSQL.py',
+    'PowerNetworkCharts/powerPacketsChartsFromSQL.py',
+    'NetworkMeasure/ipPacketsToStatsSQL.py',
+    'PowerMeasure/powerLive.py',
+    'Utility/migrateTimestamps.py',
+]
+
+
+# Get the seconds taken by every run of a command
+def time_command(command, runs):
+    seconds = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        result = subprocess.run(command, cwd=_path_parent, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        seconds.append(time.perf_counter() - start_time)
+        if result.returncode != 0:
+            sys.exit(f'{" ".join(command)} failed:\n{result.stderr.decode(errors="replace")}')
+    return seconds
+
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(
+    description='Measure the startup time of the scripts running them with --help, the time of an empty Python '
+                'interpreter is shown for reference')
+parser.add_argument('--scripts', nargs='+', default=DEFAULT_SCRIPTS,
+                    help='Scripts to measure, relative to the project directory. Default: the chart, ingest, live '
+                         'and migration scripts')
+parser.add_argument('--runs', type=int, default=5, help='Runs of every script. Default: 5')
+parser.add_argument('--max_seconds', type=float,
+                    help='Exit with an error if the median startup time of a script, minus the one of the empty '
+                         'interpreter, is higher than this')
+args = parser.parse_args()
+
+# Measure the scripts
+baseline = statistics.median(time_command([sys.executable, '-c', 'pass'], args.runs))
+print(f'{"python -c pass":<50} median {baseline:.3f}s')
+slow_scripts = []
+for script in args.scripts:
+    seconds = time_command([sys.executable, script, '--help'], args.runs)
+    median = statistics.median(seconds)
+    print(f'{script:<50} median {median:.3f}s  min {min(seconds):.3f}s  max {max(seconds):.3f}s  '
+          f'startup {median - baseline:.3f}s')
+    if args.max_seconds is not None and median - baseline > args.max_seconds:
+        slow_scripts.append(script)
+
+if slow_scripts:
+    sys.exit(f'Slower than {args.max_seconds}s: {", ".join(slow_scripts)}')
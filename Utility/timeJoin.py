@@ -0,0 +1,81 @@
+import argparse
+
+import pandas as pd
+
+# Get the frequency to read the data with once for all the grp_freqs, the finest of them. It has to divide the others,
+# or a day for the ones that are not fixed like a week, that are grouped from a day if all of them are like that
+def get_base_freq(grp_freqs):
+    deltas = {}
+    for freq in grp_freqs:
+        try:
+            deltas[freq] = pd.Timedelta(freq)
+        except ValueError:
+            deltas[freq] = None
+    fixed = [freq for freq in grp_freqs if deltas[freq] is not None]
+    base_freq = min(fixed, key=deltas.get) if fixed else '1D'
+
+    base_delta = pd.Timedelta(base_freq)
+    for freq, delta in deltas.items():
+        if (delta if delta is not None else pd.Timedelta('1D')) % base_delta:
+            raise argparse.ArgumentTypeError(f'--grp_freq {freq} is not a multiple of {base_freq}, it cannot be '
+                                             f'computed from the data grouped by {base_freq}')
+    return base_freq
+
+
+# Get the tolerance of join() from a Timedelta string like 500ms, None if there is none
+def get_tolerance(tolerance):
+    if not tolerance:
+        return None
+    try:
+        return pd.Timedelta(tolerance)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'--tolerance {tolerance} is not a time like 500ms or 2s')
+
+
+# Get the DataFrame with the timestamps of ts_field in UTC. The power of powerLive is saved without the timezone, in
+# UTC, and the packets of the ingest with it, so they can be compared only once both of them are in UTC
+def to_utc(df, ts_field):
+    timestamps = df[ts_field]
+    if timestamps.dt.tz is None:
+        timestamps = timestamps.dt.tz_localize('UTC')
+    else:
+        timestamps = timestamps.dt.tz_convert('UTC')
+    return df.assign(**{ts_field: timestamps})
+
+
+# Group again by grp_freq a DataFrame grouped by base_freq, that divides it, with the aggregate count or sum of the
+# value, or mean from the count and sum columns of the aggregate count_sum of sharedUtils.get_grouped_data_from_db.
+# Return the DataFrame with the fields
+def regroup(df, fields, grp_freq, aggregate, base_freq):
+    df = to_utc(df, fields[0])
+    grouped = df.set_index(fields[0])
+    if grp_freq != base_freq:
+        grouped = df.groupby(pd.Grouper(key=fields[0], freq=grp_freq)).sum()
+    if aggregate == 'mean':
+        grouped = (grouped['sum'] / grouped['count']).rename(fields[1])
+    else:
+        grouped = grouped[fields[1]]
+    return grouped.reset_index()
+
+
+# Join two DataFrames grouped by grp_freq, with the timestamp ts_field and one value field each, on the buckets from
+# the first to the last one of both. A bucket takes the value of the nearest bucket of each DataFrame within tolerance,
+# a Timedelta, only the one with the same timestamp if it is None. The missing values are handled with the fill
+# policy: drop only drops the buckets missing a value, zero sets the ones of right to 0, ffill sets them to the previous
+# value of their series. The timestamps are compared in UTC. Return the DataFrame and the number of buckets that were
+# missing a value
+def join(left, right, ts_field, grp_freq, tolerance=None, fill='drop'):
+    left, right = to_utc(left, ts_field), to_utc(right, ts_field)
+    index = pd.date_range(min(left[ts_field].iloc[0], right[ts_field].iloc[0]),
+                          max(left[ts_field].iloc[-1], right[ts_field].iloc[-1]), freq=grp_freq, name=ts_field)
+    method = None if tolerance is None else 'nearest'
+    series = [df.set_index(ts_field).iloc[:, 0].reindex(index, method=method, tolerance=tolerance)
+              for df in (left, right)]
+    df = pd.concat(series, axis=1)
+    missing = int(df.isna().any(axis=1).sum())
+
+    if fill == 'zero':
+        df[df.columns[1]] = df[df.columns[1]].fillna(0)
+    elif fill == 'ffill':
+        df = df.ffill()
+    return df.dropna().reset_index(), missing
@@ -0,0 +1,112 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.dates as mdates
+import pandas as pd
+
+from Utility import downsample, sharedUtils
+
+# Bucket sizes used for the zoomed data, the finest one that gives at most max_points buckets in the window is chosen
+REQUERY_FREQS = ['1s', '2s', '5s', '10s', '15s', '30s', '1min', '2min', '5min', '10min', '15min', '30min', '1h', '2h',
+                 '3h', '6h', '12h', '1D']
+
+
+# Get the finest frequency of REQUERY_FREQS with at most max_points buckets in span seconds
+def get_requery_freq(span, max_points):
+    for freq in REQUERY_FREQS:
+        if span / pd.Timedelta(freq).total_seconds() <= max_points:
+            return freq
+    return REQUERY_FREQS[-1]
+
+
+# Query again the data of the line charts with a time x axis when the x limits change, grouping only the visible
+# window with a finer bucket. The query starts debounce seconds after the last change in a thread, so the window
+# does not freeze, and the lines are updated by a timer of the canvas. The datasets need the job that loaded them,
+# from get_datasets_from_dbs, and artists are the (line, fill) of each of them from plot_data_from_datasets
+class ZoomRequery:
+    def __init__(self, fig, ax, datasets, artists, fields, grp_freq, max_points=5000, downsample_method='minmax',
+                 cache=None, debounce=0.3, poll_interval=50):
+        self.fig = fig
+        self.ax = ax
+        self.datasets = datasets
+        self.artists = list(artists)
+        self.fields = fields
+        try:
+            self.grp_delta = pd.Timedelta(grp_freq)
+        except ValueError:
+            # Not a fixed frequency, like a month, it is never finer than the others
+            self.grp_delta = pd.Timedelta.max
+        self.max_points = max_points if max_points > 0 else 5000
+        self.downsample_method = downsample_method
+        self.cache = cache
+        self.debounce = debounce
+        self.x_range = tuple(ax.dataLim.intervalx)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.shown_window = None
+        self.changed_at = None
+
+        ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+        self.timer = fig.canvas.new_timer(interval=poll_interval)
+        self.timer.add_callback(self.on_timer)
+        self.timer.start()
+        fig.canvas.mpl_connect('close_event', self.on_close)
+
+    # Stop the timer and the queries not started yet when the window is closed, so they do not keep the process alive
+    def on_close(self, _event):
+        self.timer.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def on_xlim_changed(self, ax):
+        self.changed_at = time.monotonic()
+
+    def on_timer(self):
+        if self.future is not None:
+            if not self.future.done():
+                return
+            future, self.future = self.future, None
+            if self.changed_at is None:
+                self.show(*future.result())
+
+        if self.changed_at is not None and time.monotonic() - self.changed_at >= self.debounce:
+            self.changed_at = None
+            self.requery(*self.ax.get_xlim())
+
+    # Start the query of the x window (start, end) in matplotlib dates, the original data is shown again if the window
+    # does not need a bucket finer than grp_freq
+    def requery(self, x_start, x_end):
+        x_start = max(x_start, self.x_range[0])
+        x_end = min(x_end, self.x_range[1])
+        if x_end <= x_start:
+            return
+        freq = get_requery_freq((x_end - x_start) * 86400, self.max_points)
+        window = None if pd.Timedelta(freq) >= self.grp_delta else (x_start, x_end, freq)
+        if window == self.shown_window:
+            return
+        if window is None:
+            self.show(None, [dataset['df'] for dataset in self.datasets])
+            return
+
+        start, end = [mdates.num2date(x).strftime('%Y-%m-%d %H:%M:%S') for x in (x_start, x_end)]
+        jobs = [(function, db_path, dict(kwargs, start=start, end=end, grp_freq=freq))
+                for function, db_path, kwargs in [dataset['job'] for dataset in self.datasets]]
+        self.future = self.executor.submit(self.load, window, jobs)
+
+    def load(self, window, jobs):
+        return window, [grouped[0] if grouped else None for grouped in sharedUtils.load_from_dbs(jobs, 1, self.cache)]
+
+    # Replace the data of the lines and of their fills with the DataFrames of the datasets, None is no data
+    def show(self, window, dfs):
+        for i, ((line, fill), df) in enumerate(zip(self.artists, dfs)):
+            if df is None:
+                df = self.datasets[i]['df'].iloc[:0]
+            x, y = df[self.fields[0]], df[self.fields[1]]
+            indices = downsample.get_indices(x, y, self.max_points, self.downsample_method)
+            x, y = x.iloc[indices], y.iloc[indices]
+            line.set_data(x, y)
+            if fill is not None:
+                fill.remove()
+                fill = self.ax.fill_between(x, y, color=line.get_color(), alpha=0.3)
+            self.artists[i] = line, fill
+        self.shown_window = window
+        self.fig.canvas.draw_idle()